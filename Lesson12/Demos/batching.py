@@ -0,0 +1,86 @@
+# Batched submission of many tiny Celery tasks
+#
+# Every apply_async() is one broker round trip, which costs more than a tiny
+# task itself. TaskBatcher buffers submissions for up to max_delay seconds or
+# max_items items and sends them to the run_batch task as one message. Each
+# submission still gets its own task id: run_batch stores every item's
+# result under that id, so AsyncResult and /status/<task_id> work as usual.
+
+import logging
+import threading
+import time
+
+from celery.utils import uuid
+
+from celery_task import celery, run_batch
+
+MAX_ITEMS = 100
+MAX_DELAY = 0.005
+
+logger = logging.getLogger(__name__)
+
+
+class TaskBatcher:
+    """
+    Buffers calls of one task and dispatches them in batches.
+    """
+
+    def __init__(self, task, max_items=MAX_ITEMS, max_delay=MAX_DELAY):
+        self.task = task
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self._items = []
+        self._first_at = None
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f'batcher-{task.name}', daemon=True)
+        self._thread.start()
+
+    def submit(self, *args, **kwargs):
+        """
+        Queue one call; returns its AsyncResult straight away.
+        """
+        task_id = uuid()
+        with self._cond:
+            self._items.append((task_id, args, kwargs))
+            if len(self._items) == 1:
+                self._first_at = time.monotonic()
+                self._cond.notify()
+            full = len(self._items) >= self.max_items
+        if full:
+            self.flush()
+        return self.task.AsyncResult(task_id)
+
+    def flush(self):
+        """
+        Send everything buffered so far as one run_batch message.
+        """
+        with self._cond:
+            items, self._items = self._items, []
+        if not items:
+            return
+        try:
+            run_batch.apply_async(args=[self.task.name, items])
+        except Exception as e:
+            # Make the failure visible to everyone polling these ids
+            logger.exception('Dispatching a batch of %d %s calls failed', len(items), self.task.name)
+            try:
+                for task_id, args, kwargs in items:
+                    celery.backend.mark_as_failure(task_id, e)
+            except Exception:
+                # With Redis the result backend is usually down along with the broker
+                logger.exception('Recording the failed %s calls in the result backend failed', self.task.name)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._items:
+                    self._cond.wait()
+                remaining = self._first_at + self.max_delay - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+            # One failed dispatch must not stop the batcher
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing %s calls failed', self.task.name)
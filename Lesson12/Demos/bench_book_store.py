@@ -0,0 +1,102 @@
+# Latency of book lookups, searches, updates and deletes as the store grows
+# Run it with: python bench_book_store.py --sizes 1000 100000 10000000
+#
+# For every size the store is filled with synthetic books, then random ids
+# are looked up, updated and deleted one at a time; the table shows the mean
+# and p99 per operation. Searches look for a 5-letter piece of a random
+# book's title; the vocabulary grows with the catalogue, so the number of
+# matches per search stays roughly the same across sizes. The list scan that
+# restful_demo.py used before is measured as a baseline for sizes up to
+# --max-scan.
+
+import argparse
+import random
+import time
+
+from book_store import STORES, BookStore
+
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+
+class ListScan(BookStore):
+    """
+    The original list of dicts with a linear scan per request; search() is
+    the scanning default of BookStore.
+    """
+
+    def __init__(self):
+        self.books = []
+
+    def all(self):
+        return self.books
+
+    def create(self, title, author):
+        book = {'id': self.books[-1]['id'] + 1 if self.books else 1, 'title': title, 'author': author}
+        self.books.append(book)
+        return book
+
+    def get(self, book_id):
+        return next((book for book in self.books if book['id'] == book_id), None)
+
+    def update(self, book_id, **fields):
+        book = self.get(book_id)
+        book.update(fields)
+        return book
+
+    def delete(self, book_id):
+        self.books.remove(self.get(book_id))
+        return True
+
+
+def fill(store, size, rng):
+    vocabulary = [''.join(rng.choices(LETTERS, k=rng.randint(4, 9))) for _ in range(max(size, 1000))]
+    for i in range(size):
+        store.create(' '.join(rng.choices(vocabulary, k=3)).capitalize(), ' '.join(rng.choices(vocabulary, k=2)))
+    return store
+
+
+def time_ops(operation, ids):
+    timings = []
+    for book_id in ids:
+        start = time.perf_counter_ns()
+        operation(book_id)
+        timings.append(time.perf_counter_ns() - start)
+    timings.sort()
+    return sum(timings) / len(timings) / 1000, timings[int(0.99 * (len(timings) - 1))] / 1000
+
+
+def bench(store, size, ops, rng):
+    ids = rng.sample(range(1, size + 1), min(ops, size))
+    queries = {}
+    for book_id in ids:
+        title = store.get(book_id)['title']
+        start = rng.randrange(max(len(title) - 5, 1))
+        queries[book_id] = title[start:start + 5]
+    return {
+        'get': time_ops(store.get, ids),
+        'search': time_ops(lambda book_id: store.search(title=queries[book_id]), ids),
+        'update': time_ops(lambda book_id: store.update(book_id, title='Updated'), ids),
+        'delete': time_ops(store.delete, ids),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark book stores by size')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--stores', nargs='+', default=list(STORES), choices=list(STORES))
+    parser.add_argument('--ops', type=int, default=1000, help='operations of each kind per size')
+    parser.add_argument('--max-scan', type=int, default=100_000, help='largest size for the list-scan baseline')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f'{"store":8s} {"books":>10s}   ' + '   '.join(f'{op + " us (p99)":>17s}' for op in ('get', 'search', 'update', 'delete')))
+    for size in args.sizes:
+        candidates = [(name, STORES[name]) for name in args.stores]
+        if size <= args.max_scan:
+            candidates.append(('list', ListScan))
+        for name, make in candidates:
+            store = fill(make(), size, rng)
+            results = bench(store, size, args.ops, rng)
+            cells = '   '.join(f'{mean:8.1f} ({p99:7.1f})' for mean, p99 in results.values())
+            print(f'{name:8s} {size:10d}   {cells}')
+            del store
@@ -0,0 +1,60 @@
+# POST /api/books throughput of the SQLite book store by fsync policy
+# Run it with: python bench_book_writes.py --clients 16 --posts 200
+#
+# For every fsync policy (BOOK_STORE_FSYNC) the app in restful_demo.py gets a
+# fresh SQLiteBookStore, with and without group commit, and N client threads
+# POST books through the Flask test client as fast as they can. The
+# in-memory store is measured as the upper bound.
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import restful_demo
+from book_store import FSYNC_POLICIES, InMemoryBookStore, SQLiteBookStore
+
+
+def run_clients(clients, posts):
+    """
+    POST posts books from each of clients threads; returns requests per second.
+    """
+    errors = []
+
+    def client(n):
+        test_client = restful_demo.app.test_client()
+        for i in range(posts):
+            response = test_client.post('/api/books', json={'title': f'Book {n}-{i}', 'author': 'Bench'})
+            if response.status_code != 201:
+                errors.append(response.status_code)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise RuntimeError(f'{len(errors)} POSTs failed')
+    return clients * posts / elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark POST throughput of the book stores')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--posts', type=int, default=200, help='POSTs per client')
+    args = parser.parse_args()
+
+    print(f'{args.clients} clients x {args.posts} POSTs')
+    print(f'{"store":8s} {"fsync":8s} {"commit":8s} {"POST/s":>8s}')
+    restful_demo.books = InMemoryBookStore()
+    print(f'{"memory":8s} {"-":8s} {"-":8s} {run_clients(args.clients, args.posts):8.0f}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for fsync in FSYNC_POLICIES:
+            for group_commit in (False, True):
+                path = os.path.join(tmp, f'books-{fsync}-{group_commit}.sqlite3')
+                restful_demo.books = SQLiteBookStore(path=path, fsync=fsync, group_commit=group_commit)
+                throughput = run_clients(args.clients, args.posts)
+                print(f'{"sqlite":8s} {fsync:8s} {"group" if group_commit else "single":8s} {throughput:8.0f}')
@@ -0,0 +1,86 @@
+# Dispatch latency and throughput of the Celery backends in celery_config.py
+# Run it with: python bench_celery_backends.py --backends memory sqlite redis
+#
+# For each backend a worker with a thread pool runs in this process and the
+# benchmark measures:
+#   latency     one task at a time, apply_async() to result (p50/p99)
+#   throughput  a burst of tasks sent at once, until all results are in
+# Backends whose server is not reachable (redis) are skipped.
+
+import argparse
+import tempfile
+import time
+
+import celery_config
+from celery import Celery
+from celery.contrib.testing.worker import start_worker
+
+# Result polling interval for backends without push notifications (sqlite)
+POLL_INTERVAL = 0.005
+
+
+def make_app(backend):
+    app = Celery(f'bench-{backend}')
+    app.conf.update(celery_config.celery_settings(backend))
+
+    @app.task(name='bench.noop')
+    def noop(x):
+        return x
+
+    return app, noop
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def measure(backend, samples, burst, concurrency):
+    app, noop = make_app(backend)
+    with start_worker(app, pool='threads', concurrency=concurrency, perform_ping_check=False, loglevel='ERROR'):
+        noop.delay(0).get(timeout=30, interval=POLL_INTERVAL)  # Warm up connections
+
+        latencies = []
+        for i in range(samples):
+            start = time.perf_counter()
+            noop.delay(i).get(timeout=30, interval=POLL_INTERVAL)
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        results = [noop.delay(i) for i in range(burst)]
+        for result in results:
+            result.get(timeout=120, interval=POLL_INTERVAL)
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return percentile(latencies, 0.5), percentile(latencies, 0.99), burst / elapsed
+
+
+def reachable(backend):
+    if backend != 'redis':
+        return True
+    try:
+        import redis
+        redis.Redis.from_url(celery_config.REDIS_URL, socket_connect_timeout=1).ping()
+        return True
+    except Exception:
+        return False
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark Celery broker/result backends')
+    parser.add_argument('--backends', nargs='+', default=['memory', 'sqlite', 'redis'],
+                        choices=[b for b in celery_config.BACKENDS if b != 'eager'])
+    parser.add_argument('--samples', type=int, default=200, help='sequential tasks for the latency test')
+    parser.add_argument('--burst', type=int, default=1000, help='tasks sent at once for the throughput test')
+    parser.add_argument('--concurrency', type=int, default=4, help='worker threads')
+    args = parser.parse_args()
+
+    # Fresh SQLite files for every run
+    celery_config.SQLITE_DIR = tempfile.mkdtemp()
+
+    print(f'{"backend":8s} {"p50 ms":>8s} {"p99 ms":>8s} {"tasks/s":>9s}')
+    for backend in args.backends:
+        if not reachable(backend):
+            print(f'{backend:8s} skipped (not reachable)')
+            continue
+        p50, p99, throughput = measure(backend, args.samples, args.burst, args.concurrency)
+        print(f'{backend:8s} {p50 * 1000:8.2f} {p99 * 1000:8.2f} {throughput:9.0f}')
@@ -0,0 +1,66 @@
+# Scaling benchmark for the chunked CSV aggregation in csv_tasks.py
+# Run it with: python bench_csv_chunks.py --rows 5000000 --chunk-mb 8
+#
+# Generates a CSV, splits it with chunk_ranges() and runs aggregate_range()
+# on a process pool of 1..N workers, the same work the sum_chunk tasks do in
+# Celery workers (without needing Redis). Every run is checked against the
+# single-worker result.
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from multiprocessing import Pool
+
+from csv_tasks import read_header, column_index, chunk_ranges, aggregate_range, merge_partials
+
+
+def write_csv(path, rows, seed=0):
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        f.write('id,city,temperature,humidity\n')
+        for i in range(rows):
+            f.write(f'{i},city{i % 1000},{rng.uniform(-20, 40):.2f},{rng.randint(0, 100)}\n')
+
+
+def aggregate(path, column, chunk_size, workers):
+    columns, data_start = read_header(path)
+    index = column_index(columns, column)
+    jobs = [(path, start, end, index) for start, end in chunk_ranges(path, chunk_size, data_start)]
+    with Pool(workers) as pool:
+        return merge_partials(pool.starmap(aggregate_range, jobs)), len(jobs)
+
+
+def worker_counts(max_workers):
+    counts, n = [], 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    return counts + [max_workers]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark chunked CSV aggregation')
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--chunk-mb', type=float, default=4)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--column', default='temperature')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'data.csv')
+        write_csv(path, args.rows)
+        chunk_size = int(args.chunk_mb * 1024 * 1024)
+        print(f'{args.rows} rows, {os.path.getsize(path) / 1e6:.0f} MB, {args.chunk_mb:g} MB chunks')
+
+        baseline = None
+        for workers in worker_counts(args.workers):
+            start = time.perf_counter()
+            total, chunks = aggregate(path, args.column, chunk_size, workers)
+            elapsed = time.perf_counter() - start
+            if baseline is None:
+                baseline = (total, elapsed)
+            assert total['count'] == baseline[0]['count'] and abs(total['sum'] - baseline[0]['sum']) < 1e-6 * abs(baseline[0]['sum']) + 1e-6
+            print(f'{workers:3d} workers: {elapsed:6.2f}s  speedup {baseline[1] / elapsed:4.1f}x  '
+                  f'({chunks} chunks, mean {total["mean"]:.4f})')
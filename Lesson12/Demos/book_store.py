@@ -0,0 +1,549 @@
+# Storage engines for the books REST API in restful_demo.py
+#
+# Books are kept in a dict keyed by id (a hash index on the primary key), so
+# lookup, update and delete by id take constant time however many books
+# there are. The API only talks to the BookStore interface, so another engine
+# can be swapped in with BOOK_STORE (see make_store).
+#
+# Title and author searches go through word and n-gram indexes kept in sync
+# on every write (see text_index.py) instead of scanning every book.
+#
+# Listings are paged by id (keyset pagination): page() returns the books with
+# an id greater than the last one the client has seen, so a page costs the
+# same however deep into the catalogue it is.
+#
+# BOOK_STORE=sqlite keeps the books in a SQLite file instead, which survives
+# restarts and is shared by every worker process (see SQLiteBookStore).
+#
+# Both stores can be used from many threads at once. In InMemoryBookStore,
+# writers take a lock and readers never do. Book records are immutable:
+# an update publishes a new dict in a single assignment. So a reader sees a
+# book either before or after a write, never half-updated. Search indexes
+# are updated as a diff (new postings first, then the stale ones are
+# dropped), so a book that matches a search before and after an update is
+# found throughout. The read paths rely only on CPython's atomic operations
+# on a single dict, list or set.
+
+import bisect
+import itertools
+import os
+import queue
+import sqlite3
+import sys
+import threading
+from concurrent.futures import Future
+
+from text_index import TextIndex, index_entry, normalise, words
+
+# Per-thread SQLite connections are shared with the stores at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from sqlite_connections import ThreadConnections, connect_wal
+
+BOOK_FIELDS = ('title', 'author')
+
+
+def book_matches(book, title=None, author=None, match='substring'):
+    """
+    Whether a book meets the search criteria of BookStore.search().
+    """
+    for field, query in (('title', title), ('author', author)):
+        if not query:
+            continue
+        if match == 'word':
+            if not words(query) <= words(book[field]):
+                return False
+        elif normalise(query) not in normalise(book[field]):
+            return False
+    return True
+
+
+class BookStore:
+    """
+    Interface of a book storage engine. Books are dicts with 'id', 'title'
+    and 'author'; methods return None (or False) for unknown ids.
+    """
+
+    def all(self):
+        raise NotImplementedError
+
+    def get(self, book_id):
+        raise NotImplementedError
+
+    def create(self, title, author):
+        raise NotImplementedError
+
+    def update(self, book_id, **fields):
+        raise NotImplementedError
+
+    def delete(self, book_id):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def search(self, title=None, author=None, match='substring'):
+        """
+        Books whose title and author contain the given text, case-insensitively;
+        with match='word' every word of the query must appear as a word. Empty
+        criteria match everything. This default scans all books.
+        """
+        return [book for book in self.all() if book_matches(book, title, author, match)]
+
+    def page(self, after=0, limit=100, title=None, author=None, match='substring'):
+        """
+        Up to limit books with an id greater than after, in id order, filtered
+        like search(). This default sorts the search results.
+        """
+        books = sorted((book for book in self.search(title, author, match) if book['id'] > after),
+                       key=lambda book: book['id'])
+        return books[:limit]
+
+    def pages(self, size=100, title=None, author=None, match='substring'):
+        """
+        Every book filtered like search(), in id order, as lists of up to size
+        books. This default calls page() until it runs out.
+        """
+        after = 0
+        while True:
+            books = self.page(after, size, title, author, match)
+            if books:
+                yield books
+            if len(books) < size:
+                return
+            after = books[-1]['id']
+
+
+class InMemoryBookStore(BookStore):
+    """
+    Books in a dict keyed by id. Dicts keep insertion order, so all() lists
+    books in id order. Ids are also appended to a sorted list for paging;
+    deleted ids stay in it until more than half of it is stale, then the
+    list is replaced by a compacted copy.
+    """
+
+    def __init__(self, books=()):
+        self._books = {}
+        # Writers are serialised; readers never take this lock
+        self._write_lock = threading.Lock()
+        self._next_id = itertools.count(1)
+        self._ids = []
+        self._stale_ids = 0
+        self._indexes = {field: TextIndex() for field in BOOK_FIELDS}
+        for book in books:
+            self.create(book['title'], book['author'])
+
+    def all(self):
+        return list(self._books.values())
+
+    def get(self, book_id):
+        return self._books.get(book_id)
+
+    def create(self, title, author):
+        # Index entries are built before anything is stored, so a value that
+        # cannot be indexed raises without leaving a half-written book
+        entries = {'title': index_entry(title), 'author': index_entry(author)}
+        with self._write_lock:
+            book = {'id': next(self._next_id), 'title': title, 'author': author}
+            self._books[book['id']] = book
+            # Ids only grow, so appending keeps the list sorted
+            self._ids.append(book['id'])
+            for field in BOOK_FIELDS:
+                self._indexes[field].add(book['id'], entries[field])
+        return book
+
+    def update(self, book_id, **fields):
+        with self._write_lock:
+            book = self._books.get(book_id)
+            if book is None:
+                return None
+            changed = {field: value for field, value in fields.items()
+                       if field in BOOK_FIELDS and value != book[field]}
+            if not changed:
+                return book
+            entries = {field: index_entry(value) for field, value in changed.items()}
+            # Replace the record instead of mutating it, so readers holding
+            # the old one keep a consistent copy
+            book = {**book, **changed}
+            self._books[book_id] = book
+            for field, entry in entries.items():
+                self._indexes[field].add(book_id, entry)
+        return book
+
+    def delete(self, book_id):
+        with self._write_lock:
+            book = self._books.pop(book_id, None)
+            if book is None:
+                return False
+            for index in self._indexes.values():
+                index.remove(book_id)
+            self._stale_ids += 1
+            if self._stale_ids > len(self._ids) // 2:
+                # Readers paging through the old list keep using it
+                self._ids = [i for i in self._ids if i in self._books]
+                self._stale_ids = 0
+        return True
+
+    def __len__(self):
+        return len(self._books)
+
+    def _matching_ids(self, title, author, match):
+        # None when there are no criteria
+        criteria = [(self._indexes[field], query) for field, query in (('title', title), ('author', author)) if query]
+        ids = None
+        for index, query in criteria:
+            found = index.search_words(query) if match == 'word' else index.search_substring(query)
+            ids = found if ids is None else ids & found
+        return ids
+
+    def search(self, title=None, author=None, match='substring'):
+        ids = self._matching_ids(title, author, match)
+        if ids is None:
+            return self.all()
+        return list(self._current_matches(sorted(ids), title, author, match))
+
+    def _ids_after(self, after):
+        # Book ids greater than after, in order; some may be deleted already
+        ids = self._ids  # The list may be swapped for a compacted copy meanwhile
+        for position in range(bisect.bisect_right(ids, after), len(ids)):
+            yield ids[position]
+
+    def _current_matches(self, ids, title, author, match):
+        # A writer may have changed or deleted a book since its id was found
+        # in the index, so the current record is checked again
+        for book_id in ids:
+            book = self._books.get(book_id)
+            if book is not None and book_matches(book, title, author, match):
+                yield book
+
+    def page(self, after=0, limit=100, title=None, author=None, match='substring'):
+        found = self._matching_ids(title, author, match)
+        if found is not None:
+            if len(found) ** 2 < limit * len(self._ids):
+                # Few matches: sorting them is cheaper than walking the id
+                # list past all the books in between
+                ids = sorted(found)
+                ids = ids[bisect.bisect_right(ids, after):]
+            else:
+                # Many matches: walk the id list from after and keep the
+                # matching ones, so a page costs about limit * len(_ids) / len(found)
+                # steps instead of a sort of every match
+                ids = (book_id for book_id in self._ids_after(after) if book_id in found)
+            return list(itertools.islice(self._current_matches(ids, title, author, match), limit))
+        books = (self._books.get(book_id) for book_id in self._ids_after(after))
+        return list(itertools.islice((book for book in books if book is not None), limit))
+
+    def pages(self, size=100, title=None, author=None, match='substring'):
+        # The matches are looked up and sorted once, not once per page
+        found = self._matching_ids(title, author, match)
+        if found is None:
+            books = (self._books.get(book_id) for book_id in self._ids_after(0))
+            books = (book for book in books if book is not None)
+        else:
+            books = self._current_matches(sorted(found), title, author, match)
+        while True:
+            batch = list(itertools.islice(books, size))
+            if batch:
+                yield batch
+            if len(batch) < size:
+                return
+
+
+# --------------------
+# SQLite Store
+# --------------------
+
+DEFAULT_DB_PATH = os.getenv(
+    'BOOK_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'books.sqlite3'),
+)
+
+# BOOK_STORE_FSYNC -> PRAGMA synchronous in WAL mode:
+#   always  fsync the log on every commit; survives power loss
+#   normal  fsync only at checkpoints; survives a crash of the process
+#   off     leave it to the OS
+FSYNC_POLICIES = {'always': 'FULL', 'normal': 'NORMAL', 'off': 'OFF'}
+
+# Seconds a request waits for the writer thread to commit its write; the
+# write may still be committed after the wait has given up
+WRITE_TIMEOUT = 60
+
+SQLITE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL
+);
+'''
+
+# Trigram full-text index kept in sync by triggers; it serves substring search.
+# It holds casefold() of the text, the form searches compare, because FTS5
+# by itself only folds ASCII case and would miss e.g. 'Straße' for 'STRASSE'.
+# The index is contentless (it only returns ids). Databases whose
+# user_version is not SEARCH_INDEX_VERSION get the index rebuilt on open.
+SEARCH_INDEX_VERSION = 1
+SQLITE_SEARCH_SCHEMA = [
+    'DROP TRIGGER IF EXISTS books_search_insert',
+    'DROP TRIGGER IF EXISTS books_search_delete',
+    'DROP TRIGGER IF EXISTS books_search_update',
+    'DROP TABLE IF EXISTS books_search',
+    "CREATE VIRTUAL TABLE books_search USING fts5(title, author, content='', tokenize='trigram')",
+    '''CREATE TRIGGER books_search_insert AFTER INSERT ON books BEGIN
+    INSERT INTO books_search (rowid, title, author) VALUES (new.id, casefold(new.title), casefold(new.author));
+END''',
+    '''CREATE TRIGGER books_search_delete AFTER DELETE ON books BEGIN
+    INSERT INTO books_search (books_search, rowid, title, author)
+        VALUES ('delete', old.id, casefold(old.title), casefold(old.author));
+END''',
+    '''CREATE TRIGGER books_search_update AFTER UPDATE ON books BEGIN
+    INSERT INTO books_search (books_search, rowid, title, author)
+        VALUES ('delete', old.id, casefold(old.title), casefold(old.author));
+    INSERT INTO books_search (rowid, title, author) VALUES (new.id, casefold(new.title), casefold(new.author));
+END''',
+    'INSERT INTO books_search (rowid, title, author) SELECT id, casefold(title), casefold(author) FROM books',
+]
+
+
+def _row_to_book(row):
+    return None if row is None else {'id': row[0], 'title': row[1], 'author': row[2]}
+
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+class _GroupCommitWriter(threading.Thread):
+    """
+    Runs the writes of all threads of a process on one connection and
+    commits whatever has queued up in one transaction, so concurrent writers
+    share each fsync.
+    """
+
+    def __init__(self, connect, max_batch):
+        super().__init__(name='book-store-writer', daemon=True)
+        self._connect = connect
+        self._max_batch = max_batch
+        self._queue = queue.Queue()
+
+    def submit(self, operation):
+        """
+        Run operation(db) in the next group commit and return its result.
+        """
+        future = Future()
+        self._queue.put((operation, future))
+        return future.result(timeout=WRITE_TIMEOUT)
+
+    def run(self):
+        db = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self._max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            results = []
+            try:
+                db.execute('BEGIN IMMEDIATE')
+                for operation, future in batch:
+                    # A savepoint per write, so one failing write does not undo the others
+                    db.execute('SAVEPOINT write')
+                    try:
+                        results.append((future, operation(db), None))
+                        db.execute('RELEASE write')
+                    except Exception as e:
+                        db.execute('ROLLBACK TO write')
+                        db.execute('RELEASE write')
+                        results.append((future, None, e))
+                db.execute('COMMIT')
+            except Exception as e:
+                if db.in_transaction:
+                    db.execute('ROLLBACK')
+                results = [(future, None, e) for operation, future in batch]
+            for future, result, error in results:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+
+class SQLiteBookStore(BookStore):
+    """
+    Books in a SQLite database in WAL mode, shared by every process that
+    opens the same file (e.g. several gunicorn workers). Ids come from
+    AUTOINCREMENT, so they are never reused. With group_commit, the writes
+    of a process go through one writer thread that commits them in batches;
+    otherwise every write is its own transaction.
+
+    Neither the writer thread nor any connection is started before the
+    first read or write of a process: threads do not survive a fork, and
+    connections must not cross one, so a store created before gunicorn
+    --preload forks its workers serves each worker with its own.
+    """
+
+    def __init__(self, books=(), path=None, fsync=None, group_commit=True, max_batch=256):
+        self.path = path or DEFAULT_DB_PATH
+        fsync = fsync or os.getenv('BOOK_STORE_FSYNC', 'always')
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f'Unknown BOOK_STORE_FSYNC {fsync!r}; choose one of {", ".join(FSYNC_POLICIES)}')
+        self.synchronous = FSYNC_POLICIES[fsync]
+        self._connections = ThreadConnections(self._connect)
+        # The schema is set up on a connection of its own, closed before any fork
+        db = self._connect()
+        try:
+            db.executescript(SQLITE_SCHEMA)
+            self._has_search_index = self._create_search_index(db)
+            self._seed(db, books)
+        finally:
+            db.close()
+        self.group_commit = group_commit
+        self.max_batch = max_batch
+        self._writer = None
+        self._writer_pid = None
+        self._writer_lock = threading.Lock()
+
+    def _connect(self):
+        # isolation_level=None: transactions are opened explicitly
+        db = connect_wal(self.path, timeout=30, isolation_level=None)
+        db.execute(f'PRAGMA synchronous={self.synchronous}')
+        db.create_function('casefold', 1, normalise, deterministic=True)
+        db.create_function('has_words', 2, lambda text, query: words(query) <= words(text), deterministic=True)
+        return db
+
+    def _connection(self):
+        return self._connections.get()
+
+    def _create_search_index(self, db):
+        """
+        Create the full-text index, or rebuild one of another version; False
+        if SQLite was built without FTS5, in which case searches scan the table.
+        """
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            if db.execute('PRAGMA user_version').fetchone()[0] != SEARCH_INDEX_VERSION:
+                for statement in SQLITE_SEARCH_SCHEMA:
+                    db.execute(statement)
+                db.execute(f'PRAGMA user_version = {SEARCH_INDEX_VERSION}')
+            db.execute('COMMIT')
+        except sqlite3.OperationalError:
+            db.execute('ROLLBACK')
+            return False
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return True
+
+    def _seed(self, db, books):
+        # Only the first process to open an empty database adds the seed books
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            if db.execute('SELECT NOT EXISTS (SELECT 1 FROM books)').fetchone()[0]:
+                db.executemany('INSERT INTO books (title, author) VALUES (?, ?)',
+                               [(book['title'], book['author']) for book in books])
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+    def _group_writer(self):
+        # Each process starts its own writer thread on its first write
+        pid = os.getpid()
+        if self._writer_pid != pid:
+            with self._writer_lock:
+                if self._writer_pid != pid:
+                    self._writer = _GroupCommitWriter(self._connect, self.max_batch)
+                    self._writer.start()
+                    self._writer_pid = pid
+        return self._writer
+
+    def _write(self, operation):
+        if self.group_commit:
+            return self._group_writer().submit(operation)
+        db = self._connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            result = operation(db)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return result
+
+    def all(self):
+        return self.page(limit=-1)
+
+    def get(self, book_id):
+        return _row_to_book(self._connection().execute(
+            'SELECT id, title, author FROM books WHERE id = ?', (book_id,)).fetchone())
+
+    def create(self, title, author):
+        return self._write(lambda db: _row_to_book(db.execute(
+            'INSERT INTO books (title, author) VALUES (?, ?) RETURNING id, title, author',
+            (title, author)).fetchone()))
+
+    def update(self, book_id, **fields):
+        fields = {field: value for field, value in fields.items() if field in BOOK_FIELDS}
+        if not fields:
+            return self.get(book_id)
+        assignments = ', '.join(f'{field} = ?' for field in fields)
+        return self._write(lambda db: _row_to_book(db.execute(
+            f'UPDATE books SET {assignments} WHERE id = ? RETURNING id, title, author',
+            (*fields.values(), book_id)).fetchone()))
+
+    def delete(self, book_id):
+        return self._write(lambda db: db.execute('DELETE FROM books WHERE id = ?', (book_id,)).rowcount > 0)
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM books').fetchone()[0]
+
+    def _filters(self, title, author, match):
+        """
+        SQL conditions and parameters for the search criteria.
+        """
+        conditions, params, phrases = [], [], []
+        for field, query in (('title', title), ('author', author)):
+            if not query:
+                continue
+            if match == 'word':
+                conditions.append(f'has_words({field}, ?)')
+                params.append(query)
+                # Every word is also a substring, which the index can narrow down
+                phrases += [f'{field} : {_fts_phrase(word)}' for word in words(query) if len(word) >= 3]
+            else:
+                query = normalise(query)
+                conditions.append(f'instr(casefold({field}), ?) > 0')
+                params.append(query)
+                # The index holds casefolded text too; it cannot match fewer than 3 characters
+                if len(query) >= 3:
+                    phrases.append(f'{field} : {_fts_phrase(query)}')
+        if phrases and self._has_search_index:
+            conditions.append('id IN (SELECT rowid FROM books_search WHERE books_search MATCH ?)')
+            params.append(' AND '.join(phrases))
+        return conditions, params
+
+    def search(self, title=None, author=None, match='substring'):
+        return self.page(limit=-1, title=title, author=author, match=match)
+
+    def page(self, after=0, limit=100, title=None, author=None, match='substring'):
+        conditions, params = self._filters(title, author, match)
+        where = ' AND '.join(['id > ?'] + conditions)
+        rows = self._connection().execute(
+            f'SELECT id, title, author FROM books WHERE {where} ORDER BY id LIMIT ?', (after, *params, limit)
+        ).fetchall()
+        return [_row_to_book(row) for row in rows]
+
+
+STORES = {
+    'memory': InMemoryBookStore,
+    'sqlite': SQLiteBookStore,
+}
+
+
+def make_store(kind=None, books=()):
+    """
+    A store of the kind named by kind or the BOOK_STORE variable (default
+    'memory'), filled with books.
+    """
+    kind = kind or os.getenv('BOOK_STORE', 'memory')
+    if kind not in STORES:
+        raise ValueError(f'Unknown BOOK_STORE {kind!r}; choose one of {", ".join(STORES)}')
+    return STORES[kind](books)
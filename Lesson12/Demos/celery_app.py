@@ -2,33 +2,61 @@
 # Setup Redis and Celery and start the services in terminal
 # run redis-server after installing redis (pip install redis)
 # run celery -A celery_task worker --loglevel=info after installing celery (pip install celery)
+#
+# Without Redis: CELERY_BACKEND=memory python celery_app.py runs the worker
+# inside the app; CELERY_BACKEND=sqlite keeps queue and results in SQLite
+# files (see celery_config.py).
+#
+# Task status is pushed over SocketIO: a client emits 'watch' with a task_id
+# and then receives 'task_status' events for that task, with the same fields
+# as the /status response. Workers publish through Redis (see celery_task.py).
 
-from flask import Flask, url_for, jsonify
-from flask_socketio import SocketIO
 import os
 from dotenv import load_dotenv
-from celery import Celery
 
-# Load environment variables from .env file
+# Load environment variables from .env file; CELERY_BACKEND may be set there
 load_dotenv()
 
+from celery_config import socketio_message_queue
+
+# With the Redis message queue, eventlet has to patch the standard library
+# before anything else imports it, otherwise the queue listener blocks the
+# eventlet hub. The memory and eager backends run their worker on real
+# threads inside this process, so they are left unpatched.
+if socketio_message_queue():
+    import eventlet
+    eventlet.monkey_patch()
+
+from flask import Flask, request, url_for, jsonify
+from flask_socketio import SocketIO, emit, join_room, leave_room
+import threading
+import time
+from collections import OrderedDict
+
 # Initialize Flask app
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY')
 
-# Configure Celery with Redis as the message broker and result backend
-app.config['CELERY_BROKER_URL'] = 'redis://localhost:6379/0'  # Using Redis database 0
-app.config['CELERY_RESULT_BACKEND'] = 'redis://localhost:6379/0'
+# Import tasks; the broker and result backend are chosen by CELERY_BACKEND (see celery_config.py)
+from celery_task import (celery, long_task, add, request_cancel, use_status_emitter,
+                         CANCELLED, MESSAGE_QUEUE, TASK_STATUS_EVENT)
+from batching import TaskBatcher
+from celery_config import CELERY_BACKEND, start_embedded_worker
+from csv_tasks import process_csv, cached_summary
+from uploads import save_stream, UploadTooLarge
 
-# Initialize Celery
-celery = Celery(app.name, broker=app.config['CELERY_BROKER_URL'])
-celery.conf.update(app.config)
+# Optional upload size limit in bytes
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', 0)) or None
 
-# Import tasks
-from celery_task import long_task
+# Initialize SocketIO; the Redis message queue carries the workers' status events
+socketio = SocketIO(app, async_mode='eventlet', message_queue=MESSAGE_QUEUE)
+if MESSAGE_QUEUE is None:
+    # Workers run in this process and emit directly
+    use_status_emitter(socketio)
 
-# Initialize SocketIO
-socketio = SocketIO(app, async_mode='eventlet')
+# The in-process broker is only reachable from a worker in this process
+if CELERY_BACKEND == 'memory':
+    embedded_worker = start_embedded_worker(celery)
 
 @app.route('/start-task', methods=['POST'])
 def start_task():
@@ -40,11 +68,130 @@ def start_task():
     # Return the task ID to the client
     return jsonify({'task_id': task.id}), 202, {'Location': url_for('task_status', task_id=task.id)}
 
+# Small tasks are buffered for a few milliseconds and sent to the broker together
+add_batcher = TaskBatcher(add)
+
+@app.route('/start-small-task', methods=['POST'])
+def start_small_task():
+    """
+    Starts a tiny task (x + y) through the batcher.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        x, y = float(data['x']), float(data['y'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'JSON body with numbers x and y is required'}), 400
+    task = add_batcher.submit(x, y)
+    return jsonify({'task_id': task.id}), 202, {'Location': url_for('task_status', task_id=task.id)}
+
+@app.route('/upload-csv', methods=['POST'])
+def upload_csv():
+    """
+    Streams an uploaded CSV to disk and starts summing one of its columns.
+    Accepts a raw request body or a multipart form field named 'file'.
+    Returns the stored result directly if the same file was summed before.
+    """
+    column = request.args.get('column')
+    if not column:
+        return jsonify({'error': 'column query parameter is required'}), 400
+    # Multipart files are already spooled to disk by Werkzeug; any other body
+    # (curl --data-binary sends it as a form) is read straight from the socket,
+    # and touching request.files would make Werkzeug buffer it as form data
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({'error': "multipart uploads need a 'file' field"}), 400
+        stream = upload.stream
+    else:
+        stream = request.stream
+    try:
+        digest, path, size, created = save_stream(stream, max_bytes=MAX_UPLOAD_BYTES)
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    column = int(column) if column.isdigit() else column
+    try:
+        # A file seen before is answered from the result cache without a new job
+        result = cached_summary(digest, path, column)
+        if result is not None:
+            return jsonify({'sha256': digest, 'size': size, 'cached': True, 'result': result})
+        task = process_csv(path, column, sha256=digest)
+    except ValueError as e:
+        # Empty, non-UTF-8 or headerless files would otherwise stay in uploads/
+        # forever; a copy stored by an earlier upload may still be in use
+        if created:
+            os.remove(path)
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'task_id': task.id, 'sha256': digest, 'size': size}), 202, {
+        'Location': url_for('task_status', task_id=task.id)
+    }
+
+# --------------------
+# Status Cache
+# --------------------
+
+# Tasks publish progress at most every PROGRESS_INTERVAL seconds, so polls
+# within STATUS_TTL reuse the last answer instead of querying the result
+# backend again. Final states never change and are kept until evicted.
+STATUS_TTL = 1.0
+STATUS_CACHE_SIZE = 10000
+FINAL_STATES = {'SUCCESS', 'FAILURE', 'REVOKED', CANCELLED}
+
+class StatusCache:
+    """
+    Small LRU of task_id -> (fetched_at, status response).
+    """
+
+    def __init__(self, ttl=STATUS_TTL, max_entries=STATUS_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, task_id):
+        with self._lock:
+            entry = self._entries.get(task_id)
+            if entry is None:
+                return None
+            fetched_at, response = entry
+            if response['state'] not in FINAL_STATES and time.monotonic() - fetched_at >= self.ttl:
+                return None
+            self._entries.move_to_end(task_id)
+            return response
+
+    def put(self, task_id, response):
+        with self._lock:
+            self._entries[task_id] = (time.monotonic(), response)
+            self._entries.move_to_end(task_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def forget(self, task_id):
+        with self._lock:
+            self._entries.pop(task_id, None)
+
+status_cache = StatusCache()
+
 @app.route('/status/<task_id>')
 def task_status(task_id):
     """
     Retrieves the status of a Celery task.
     """
+    return jsonify(current_status(task_id))
+
+def current_status(task_id):
+    """
+    Status response for a task, from the cache when fresh enough.
+    """
+    response = status_cache.get(task_id)
+    if response is None:
+        response = fetch_task_status(task_id)
+        status_cache.put(task_id, response)
+    return response
+
+def fetch_task_status(task_id):
+    """
+    Reads a task's state from the result backend.
+    """
     task = long_task.AsyncResult(task_id)
     if task.state == 'PENDING':
         # Task is pending
@@ -52,7 +199,14 @@ def task_status(task_id):
             'state': task.state,
             'status': 'Pending...'
         }
-    elif task.state != 'FAILURE':
+    elif task.state in ('PROGRESS', CANCELLED):
+        # Task is running (or was stopped): info holds current, total, percent and eta
+        response = {
+            'state': task.state,
+            'status': 'Cancelled' if task.state == CANCELLED else 'In progress...',
+            'progress': task.info
+        }
+    elif task.state not in ('FAILURE', 'REVOKED'):
         # Task is processing or completed
         response = {
             'state': task.state,
@@ -61,12 +215,44 @@ def task_status(task_id):
         if task.state == 'SUCCESS':
             response['result'] = task.result
     else:
-        # Task failed
+        # Task failed or was revoked before it started
         response = {
             'state': task.state,
             'status': str(task.info)  # Exception info
         }
-    return jsonify(response)
+    return response
+
+@app.route('/cancel/<task_id>', methods=['POST'])
+def cancel_task(task_id):
+    """
+    Requests cancellation of a Celery task.
+    """
+    request_cancel(task_id)
+    status_cache.forget(task_id)
+    return jsonify({'task_id': task_id, 'status': 'Cancellation requested'}), 202, {
+        'Location': url_for('task_status', task_id=task_id)
+    }
+
+# --------------------
+# SocketIO Status Push
+# --------------------
+
+@socketio.on('watch')
+def watch_task(data):
+    """
+    Subscribes the client to status events of a task.
+    """
+    task_id = data['task_id']
+    join_room(task_id)
+    # Send the current state so a late watcher does not miss earlier transitions
+    emit(TASK_STATUS_EVENT, {'task_id': task_id, **current_status(task_id)})
+
+@socketio.on('unwatch')
+def unwatch_task(data):
+    """
+    Unsubscribes the client from a task.
+    """
+    leave_room(data['task_id'])
 
 @app.route('/')
 def index():
@@ -79,6 +265,15 @@ def index():
     <p>Example:</p>
     <pre>
     curl -X POST http://localhost:5000/start-task
+    curl http://localhost:5000/status/&lt;task_id&gt;
+    curl -X POST http://localhost:5000/cancel/&lt;task_id&gt;
+    curl -X POST -H "Content-Type: application/json" -d '{"x": 1, "y": 2}' http://localhost:5000/start-small-task
+    curl -X POST --data-binary @data.csv "http://localhost:5000/upload-csv?column=temperature"
+    </pre>
+    <p>Or watch a task over SocketIO instead of polling:</p>
+    <pre>
+    socket.emit('watch', {task_id: taskId});
+    socket.on('task_status', status =&gt; console.log(status.state, status.progress));
     </pre>
     '''
 
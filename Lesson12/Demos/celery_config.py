@@ -0,0 +1,92 @@
+# Broker and result backend selection for celery_task.py and celery_app.py
+#
+# CELERY_BACKEND picks one of:
+#   redis   Redis broker and result backend (default; needs redis-server)
+#   sqlite  SQLite files for both, through SQLAlchemy; no server, works across
+#           processes (run the worker as usual with celery -A celery_task worker)
+#           Workers poll the queue table once a second, so tasks take ~1s to start.
+#   memory  In-process broker and results; the web app starts its own worker
+#           thread, so nothing else needs to run. Handy for development.
+#   eager   Tasks run synchronously inside apply_async(); for tests.
+#
+# The task API is the same for all of them. Only redis carries SocketIO
+# events between processes; with memory and eager the worker runs inside
+# the web server, which emits the events itself. With sqlite, clients poll
+# /status, and running tasks can still be cancelled but queued ones are not
+# revoked.
+
+import atexit
+import contextlib
+import os
+
+DEMOS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CELERY_BACKEND = os.getenv('CELERY_BACKEND', 'redis')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+SQLITE_DIR = os.getenv('CELERY_SQLITE_DIR', DEMOS_DIR)
+
+# Seconds between queue polls of the in-memory transport (kombu's default is 1)
+MEMORY_POLL_INTERVAL = 0.001
+
+BACKENDS = ('redis', 'sqlite', 'memory', 'eager')
+
+
+def celery_settings(backend=CELERY_BACKEND):
+    """
+    Celery configuration for a backend name.
+    """
+    if backend == 'redis':
+        return {'broker_url': REDIS_URL, 'result_backend': REDIS_URL}
+    if backend == 'sqlite':
+        return {
+            'broker_url': 'sqla+sqlite:///' + os.path.join(SQLITE_DIR, 'celery-broker.sqlite3'),
+            'result_backend': 'db+sqlite:///' + os.path.join(SQLITE_DIR, 'celery-results.sqlite3'),
+            # The database broker cannot broadcast, so revoke and ping are unavailable
+            'worker_enable_remote_control': False,
+        }
+    if backend == 'memory':
+        return {
+            'broker_url': 'memory://',
+            'result_backend': 'cache+memory://',
+            'broker_transport_options': {'polling_interval': MEMORY_POLL_INTERVAL},
+            # With a bounded prefetch window the worker only refills it every
+            # couple of seconds on this transport
+            'worker_prefetch_multiplier': 0,
+        }
+    if backend == 'eager':
+        return {
+            'broker_url': 'memory://',
+            'result_backend': 'cache+memory://',
+            'task_always_eager': True,
+            'task_store_eager_result': True,
+        }
+    raise ValueError(f'Unknown CELERY_BACKEND {backend!r}; choose one of {", ".join(BACKENDS)}')
+
+
+def socketio_message_queue(backend=CELERY_BACKEND):
+    """
+    Message queue URL for SocketIO events from workers, or None when the
+    worker runs inside the web server.
+    """
+    return REDIS_URL if backend == 'redis' else None
+
+
+def has_remote_control(backend=CELERY_BACKEND):
+    """
+    Whether broadcast commands such as revoke reach the workers.
+    """
+    return backend != 'sqlite'
+
+
+def start_embedded_worker(app, concurrency=4):
+    """
+    Run a thread-pool worker for app inside this process (memory backend).
+    Returns an ExitStack; close it to stop the worker (done at exit anyway).
+    """
+    from celery.contrib.testing.worker import start_worker
+
+    stack = contextlib.ExitStack()
+    stack.enter_context(start_worker(app, pool='threads', concurrency=concurrency,
+                                     perform_ping_check=False, loglevel='WARNING'))
+    atexit.register(stack.close)
+    return stack
@@ -1,16 +1,174 @@
 # tasks.py
 
 from celery import Celery
+from celery.exceptions import Ignore
+from celery.signals import task_postrun
+from flask_socketio import SocketIO
+import logging
 import time
 
-celery = Celery('tasks', broker='redis://localhost:6379/0', backend='redis://localhost:6379/0')
+from celery_config import CELERY_BACKEND, celery_settings, socketio_message_queue, has_remote_control
 
-@celery.task
-def long_task():
+# Broker and result backend come from CELERY_BACKEND (see celery_config.py)
+# csv_tasks holds the chunked CSV aggregation chord
+celery = Celery('tasks', include=['csv_tasks'])
+celery.conf.update(celery_settings(CELERY_BACKEND))
+
+logger = logging.getLogger(__name__)
+
+# Write-only SocketIO handle: workers publish through the Redis message queue
+# and the web server relays each event to the clients in the task's room.
+# Without a message queue the web server installs its own SocketIO instead
+# (see use_status_emitter).
+MESSAGE_QUEUE = socketio_message_queue(CELERY_BACKEND)
+status_events = SocketIO(message_queue=MESSAGE_QUEUE) if MESSAGE_QUEUE else None
+TASK_STATUS_EVENT = 'task_status'
+
+# Progress is published at most this often (seconds), however fast the task loops
+PROGRESS_INTERVAL = 0.5
+
+# Custom state for tasks stopped through the /cancel endpoint
+CANCELLED = 'CANCELLED'
+# State of the cancellation flag record
+CANCEL_REQUESTED = 'CANCEL_REQUESTED'
+
+
+def cancel_key(task_id):
+    """
+    Result-backend id of a task's cancellation flag.
+    """
+    return f'cancel-task-{task_id}'
+
+
+def use_status_emitter(socketio):
+    """
+    Publish status events through socketio; for backends whose workers run
+    inside the web server.
+    """
+    global status_events
+    status_events = socketio
+
+
+def publish_status(task_id, state, **fields):
+    """
+    Push a status update to the clients watching task_id. The payload has the
+    same keys as the /status response, plus task_id.
+    """
+    if status_events is None:
+        return
+    try:
+        status_events.emit(TASK_STATUS_EVENT, {'task_id': task_id, 'state': state, **fields}, to=task_id)
+    except Exception:
+        # Watchers can still fall back to polling /status
+        logger.warning('Could not publish status of task %s', task_id, exc_info=True)
+
+
+def request_cancel(task_id):
+    """
+    Ask a task to stop. A task that has not started yet is revoked; a running
+    one sees the flag at its next progress check and stops cleanly.
+    """
+    # Stored like a task result so that every result backend can hold it
+    celery.backend.store_result(cancel_key(task_id), None, CANCEL_REQUESTED)
+    # Revoking a running task would overwrite its CANCELLED state
+    if has_remote_control(CELERY_BACKEND) and celery.AsyncResult(task_id).state == 'PENDING':
+        celery.control.revoke(task_id)
+
+
+def cancel_requested(task_id):
+    return celery.backend.get_task_meta(cancel_key(task_id))['status'] == CANCEL_REQUESTED
+
+
+class ProgressReporter:
+    """
+    Publishes PROGRESS state (current, total, percent, ETA) for a bound task,
+    rate-limited to one result-backend write and one SocketIO push per
+    interval, and checks for cancellation at the same rate.
+    """
+
+    def __init__(self, task, total, interval=PROGRESS_INTERVAL):
+        self.task = task
+        self.total = total
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_published = None
+
+    def update(self, current):
+        """
+        Record progress; raises Ignore after marking the task CANCELLED if a
+        cancellation was requested.
+        """
+        now = time.monotonic()
+        if self.last_published is not None and now - self.last_published < self.interval:
+            return
+        self.last_published = now
+
+        task_id = self.task.request.id
+        meta = self.meta(current, now)
+        if cancel_requested(task_id):
+            self.task.update_state(state=CANCELLED, meta=meta)
+            publish_status(task_id, CANCELLED, status='Cancelled', progress=meta)
+            # Ignore stops Celery from overwriting the CANCELLED state
+            raise Ignore()
+        self.task.update_state(state='PROGRESS', meta=meta)
+        publish_status(task_id, 'PROGRESS', status='In progress...', progress=meta)
+
+    def meta(self, current, now):
+        elapsed = now - self.started
+        eta = elapsed / current * (self.total - current) if current else None
+        return {
+            'current': current,
+            'total': self.total,
+            'percent': round(100.0 * current / self.total, 1),
+            'eta': None if eta is None else round(eta, 1),
+        }
+
+
+@celery.task(bind=True)
+def long_task(self):
     """
     Simulates a long-running task.
     """
     total = 25
+    progress = ProgressReporter(self, total)
     for i in range(total):
+        progress.update(i)
         time.sleep(1)
-    return 'Task completed!'
\ No newline at end of file
+    return 'Task completed!'
+
+
+@celery.task
+def add(x, y):
+    """
+    A tiny task; submitted in batches through batching.TaskBatcher.
+    """
+    return x + y
+
+
+@celery.task
+def run_batch(task_name, items):
+    """
+    Runs a batch of (task_id, args, kwargs) calls of one task and stores each
+    result under its own task id.
+    """
+    task = celery.tasks[task_name]
+    for task_id, args, kwargs in items:
+        try:
+            result = task(*args, **kwargs)
+        except Exception as e:
+            celery.backend.mark_as_failure(task_id, e)
+        else:
+            celery.backend.mark_as_done(task_id, result)
+    return len(items)
+
+
+@task_postrun.connect(sender=long_task)
+def publish_final_status(task_id=None, state=None, retval=None, **kwargs):
+    """
+    Push the outcome of long_task runs; chunk tasks of the CSV chord have no
+    watchers, so they do not publish.
+    """
+    if state == 'SUCCESS':
+        publish_status(task_id, state, status=None, result=retval)
+    elif state == 'FAILURE':
+        publish_status(task_id, state, status=str(retval))
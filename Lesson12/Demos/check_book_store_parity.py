@@ -0,0 +1,79 @@
+# Check that the SQLite book store answers searches like the in-memory one
+# Run it with: python check_book_store_parity.py --books 2000 --queries 1000
+#
+# Both stores get the same random books, whose titles and authors mix ASCII
+# words with words that casefolding changes ('Straße', 'ﬁle', 'ΣΊΣΥΦΟΣ'),
+# and then the same updates and deletes. The same substring and word queries
+# are then run against both, in upper, lower and original case. Every query
+# must return the same ids from both stores; the script exits non-zero
+# otherwise.
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+from book_store import InMemoryBookStore, SQLiteBookStore
+
+WORDS = ['Straße', 'STRASSE', 'strasse', 'ﬁle', 'file', 'Profile', 'ΣΊΣΥΦΟΣ', 'σίσυφος', 'Ǆemal', 'Ångström',
+         'Kelvin', 'ǅungla', 'İstanbul', 'Code', 'Clean', 'Algorithms', 'Pragmatic', 'ﬂow', 'Massachusetts']
+FIXED_QUERIES = ['STRASSE', 'ass', 'sse', 'file', 'fil', 'ﬁ', 'σίσυ', 'ΣΊΣ', 'ǆem', 'ångs', 'flow']
+
+
+def random_text(rng, k):
+    return ' '.join(rng.choices(WORDS, k=k))
+
+
+def random_query(rng, books):
+    book = rng.choice(books)
+    text = book[rng.choice(('title', 'author'))]
+    start = rng.randrange(len(text))
+    query = text[start:start + rng.randint(1, 8)]
+    return rng.choice((query, query.upper(), query.lower()))
+
+
+def fill(stores, size, rng):
+    for i in range(size):
+        title, author = random_text(rng, 3), random_text(rng, 2)
+        for store in stores:
+            store.create(title, author)
+    # Exercise the update and delete triggers as well
+    for book_id in rng.sample(range(1, size + 1), size // 5):
+        title = random_text(rng, 3)
+        for store in stores:
+            store.update(book_id, title=title)
+    for book_id in rng.sample(range(1, size + 1), size // 10):
+        for store in stores:
+            store.delete(book_id)
+
+
+def compare(stores, query, field, match):
+    results = [[book['id'] for book in store.search(**{field: query}, match=match)] for store in stores]
+    return results[0] == results[1], [len(ids) for ids in results]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the search results of the book stores')
+    parser.add_argument('--books', type=int, default=2000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = [InMemoryBookStore(), SQLiteBookStore(path=os.path.join(tmp, 'books.sqlite3'))]
+        fill(stores, args.books, rng)
+        books = stores[0].all()
+        queries = FIXED_QUERIES + [random_query(rng, books) for _ in range(args.queries)]
+        mismatches = 0
+        for query in queries:
+            for field in ('title', 'author'):
+                for match in ('substring', 'word'):
+                    same, counts = compare(stores, query, field, match)
+                    if not same:
+                        mismatches += 1
+                        print(f'{field}={query!r} match={match}: memory {counts[0]} hits, sqlite {counts[1]}')
+    checks = len(queries) * 4
+    print(f'{checks - mismatches}/{checks} searches agree')
+    sys.exit(1 if mismatches else 0)
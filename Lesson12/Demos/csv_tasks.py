@@ -0,0 +1,168 @@
+# Chunked, parallel CSV aggregation with a Celery chord
+#
+# A multi-GB CSV is split into byte ranges that start and end on line
+# boundaries. Each range is aggregated by its own sum_chunk task (count, sum,
+# min, max of one column) and combine_partials reduces the partial results
+# into the totals and the mean. Workers only need the file path, so the file
+# must be on storage shared with the workers.
+#
+# Byte ranges are aligned on newlines, so quoted fields must not contain line
+# breaks. Empty or non-numeric cells are counted as skipped.
+#
+# Results are stored in the result cache under the upload's content hash, so
+# the web server can answer a repeated upload without starting a new chord.
+#
+# Registered on the app in celery_task.py; start a worker with
+#   celery -A celery_task worker --loglevel=info
+
+import csv
+import math
+import os
+
+from celery import chord, group
+
+from celery_task import celery
+from result_cache import ResultCache
+
+# Bytes per chunk task; large enough that task overhead is negligible
+CHUNK_SIZE = 64 * 1024 * 1024
+ENCODING = 'utf-8'
+
+# Result cache operation name of the column aggregate
+OPERATION = 'column_summary'
+
+result_cache = ResultCache()
+
+
+def read_header(path):
+    """
+    (column names, byte offset of the first data row).
+    """
+    with open(path, 'rb') as f:
+        line = f.readline()
+        return next(csv.reader([line.decode(ENCODING)])), f.tell()
+
+
+def column_index(columns, column):
+    """
+    Index of a column given by name or by position.
+    """
+    if isinstance(column, int):
+        if not -len(columns) <= column < len(columns):
+            raise ValueError(f'Column {column} out of range; the file has {len(columns)} columns')
+        return column % len(columns)
+    if column not in columns:
+        raise ValueError(f'Unknown column {column!r}; the file has {columns}')
+    return columns.index(column)
+
+
+def resolve_column(path, column):
+    """
+    (column name, column index, byte offset of the first data row).
+    """
+    columns, data_start = read_header(path)
+    index = column_index(columns, column)
+    return columns[index], index, data_start
+
+
+def chunk_ranges(path, chunk_size=CHUNK_SIZE, start=0):
+    """
+    (start, end) byte ranges covering the file from start, each ending just
+    after a newline.
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as f:
+        while start < size:
+            f.seek(min(start + chunk_size, size))
+            f.readline()  # Move to the end of the current line
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def empty_partial():
+    return {'count': 0, 'sum': 0.0, 'min': math.inf, 'max': -math.inf, 'skipped': 0}
+
+
+def aggregate_range(path, start, end, index):
+    """
+    Partial aggregate of one column over the rows in bytes [start, end).
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode(ENCODING)
+
+    partial = empty_partial()
+    values = []
+    for row in csv.reader(text.splitlines()):
+        try:
+            values.append(float(row[index]))
+        except (IndexError, ValueError):
+            partial['skipped'] += 1
+    if values:
+        partial.update(count=len(values), sum=math.fsum(values), min=min(values), max=max(values))
+    return partial
+
+
+def merge_partials(partials):
+    """
+    Combine partial aggregates into totals and the mean.
+    """
+    total = empty_partial()
+    for partial in partials:
+        total['count'] += partial['count']
+        total['sum'] += partial['sum']
+        total['min'] = min(total['min'], partial['min'])
+        total['max'] = max(total['max'], partial['max'])
+        total['skipped'] += partial['skipped']
+    if total['count'] == 0:
+        total.update(min=None, max=None)
+    total['mean'] = total['sum'] / total['count'] if total['count'] else None
+    return total
+
+
+# --------------------
+# Celery Tasks
+# --------------------
+
+@celery.task
+def sum_chunk(path, start, end, index):
+    """
+    Aggregates one byte range of a CSV file.
+    """
+    return aggregate_range(path, start, end, index)
+
+
+@celery.task
+def combine_partials(partials, column, sha256=None):
+    """
+    Chord callback: reduces the chunk results and caches the total under the
+    file's content hash.
+    """
+    total = merge_partials(partials)
+    total['column'] = column
+    total['chunks'] = len(partials)
+    if sha256 is not None:
+        result_cache.put(sha256, OPERATION, column, total)
+    return total
+
+
+def cached_summary(sha256, path, column):
+    """
+    Cached aggregate of a column of an uploaded file, or None.
+    """
+    name, index, data_start = resolve_column(path, column)
+    return result_cache.get(sha256, OPERATION, name)
+
+
+def process_csv(path, column, chunk_size=CHUNK_SIZE, sha256=None):
+    """
+    Start the chord for one file and column; returns the AsyncResult of the
+    reducer, whose result is the final aggregate.
+    """
+    name, index, data_start = resolve_column(path, column)
+    chunks = group(sum_chunk.s(path, start, end, index)
+                   for start, end in chunk_ranges(path, chunk_size, data_start))
+    return chord(chunks)(combine_partials.s(name, sha256))
@@ -1,5 +1,11 @@
 # app.py
-from flask import Flask, request, jsonify, abort
+import base64
+import binascii
+import json
+
+from flask import Flask, Response, request, jsonify, abort
+
+from book_store import make_store, BOOK_FIELDS
 
 app = Flask(__name__)
 
@@ -7,25 +13,113 @@ app = Flask(__name__)
 # In-Memory Data Store
 # --------------------
 
-# A simple in-memory data store to hold our resources
-# For demonstration purposes, we'll use a list of dictionaries
-books = [
+# The books live in a store indexed by id (see book_store.py), so finding,
+# updating and deleting a book does not scan the whole collection.
+# BOOK_STORE=sqlite keeps them in a SQLite file that survives restarts and is
+# shared by all worker processes, e.g. gunicorn -w 4 restful_demo:app
+books = make_store(books=[
     {'id': 1, 'title': 'The Pragmatic Programmer', 'author': 'Andrew Hunt'},
     {'id': 2, 'title': 'Clean Code', 'author': 'Robert C. Martin'},
     {'id': 3, 'title': 'Introduction to Algorithms', 'author': 'Thomas H. Cormen'}
-]
+])
+
+# --------------------
+# Listing Helpers
+# --------------------
+
+# Listings are paged; clients follow next_cursor until it is null
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Books fetched per step while streaming an export
+EXPORT_BATCH = 1000
+
+def encode_cursor(book_id):
+    """
+    Opaque cursor pointing just after a book.
+    """
+    return base64.urlsafe_b64encode(f'after:{book_id}'.encode()).decode()
+
+def decode_cursor(cursor):
+    """
+    ID of the last book of the previous page; 400 if the cursor is invalid.
+    """
+    try:
+        prefix, book_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        if prefix != 'after':
+            raise ValueError(cursor)
+        return int(book_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        abort(400)
+
+def listing_args():
+    """
+    Search filters and field projection shared by the listing routes.
+    """
+    # Case-insensitive substring search, or whole words with match=word
+    filters = {
+        'title': request.args.get('title'),
+        'author': request.args.get('author'),
+        'match': request.args.get('match', 'substring'),
+    }
+    if filters['match'] not in ('substring', 'word'):
+        abort(400)
+    # fields=id,title returns only those fields of each book
+    fields = request.args.get('fields')
+    fields = fields.split(',') if fields else None
+    if fields is not None and not set(fields) <= {'id', *BOOK_FIELDS}:
+        abort(400)
+    return filters, fields
+
+def project(book, fields):
+    return book if fields is None else {field: book[field] for field in fields}
+
+def valid_book_fields(data):
+    """
+    Whether a request body is an object whose title and author, where given,
+    are strings; the search indexes cannot hold anything else.
+    """
+    return isinstance(data, dict) and all(isinstance(data[field], str) for field in BOOK_FIELDS if field in data)
 
 # --------------------
 # RESTful API Routes
 # --------------------
 
-# Route to get all books
+# Route to get all books, one page at a time
 @app.route('/api/books', methods=['GET'])
 def get_books():
     """
-    Get the list of all books.
+    Get a page of books, optionally filtered by title and author.
     """
-    return jsonify({'books': books})
+    filters, fields = listing_args()
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        abort(400)
+    cursor = request.args.get('cursor')
+    after = decode_cursor(cursor) if cursor else 0
+    # One extra book tells whether there is a next page
+    page = books.page(after, limit + 1, **filters)
+    next_cursor = encode_cursor(page[limit - 1]['id']) if len(page) > limit else None
+    return jsonify({'books': [project(book, fields) for book in page[:limit]], 'next_cursor': next_cursor})
+
+# Route to export all matching books as one streamed JSON document
+@app.route('/api/books/export', methods=['GET'])
+def export_books():
+    """
+    Stream every book, optionally filtered by title and author.
+    """
+    filters, fields = listing_args()
+
+    def generate():
+        # Books are read page by page, so the export never holds them all at once
+        yield '{"books": ['
+        first = True
+        for page in books.pages(EXPORT_BATCH, **filters):
+            for book in page:
+                yield ('' if first else ',') + json.dumps(project(book, fields))
+                first = False
+        yield ']}'
+
+    return Response(generate(), mimetype='application/json')
 
 # Route to get a book by its ID
 @app.route('/api/books/<int:book_id>', methods=['GET'])
@@ -33,8 +127,8 @@ def get_book(book_id):
     """
     Get a single book by ID.
     """
-    # Search for the book in the list
-    book = next((book for book in books if book['id'] == book_id), None)
+    # Look the book up by its ID
+    book = books.get(book_id)
     if book is None:
         # If the book is not found, return a 404 response
         abort(404)
@@ -50,13 +144,11 @@ def create_book():
     if not request.json or not 'title' in request.json or not 'author' in request.json:
         # Bad request if 'title' or 'author' is missing in the request
         abort(400)
-    # Create a new book object
-    new_book = {
-        'id': books[-1]['id'] + 1 if books else 1,  # Incremental ID
-        'title': request.json['title'],
-        'author': request.json['author']
-    }
-    books.append(new_book)
+    if not valid_book_fields(request.json):
+        # Bad request if 'title' or 'author' is not a string
+        abort(400)
+    # Create a new book object; the store assigns an incremental ID
+    new_book = books.create(request.json['title'], request.json['author'])
     # Return the new book with 201 Created status
     return jsonify({'book': new_book}), 201
 
@@ -67,16 +159,18 @@ def update_book(book_id):
     Update a book by ID.
     """
     # Find the book to update
-    book = next((book for book in books if book['id'] == book_id), None)
+    book = books.get(book_id)
     if book is None:
         # If the book is not found, return a 404 response
         abort(404)
-    if not request.json:
-        # Bad request if no JSON data is provided
+    if not request.json or not valid_book_fields(request.json):
+        # Bad request if no JSON data is provided or a field is not a string
         abort(400)
-    # Update the book's title and author if provided in the request
-    book['title'] = request.json.get('title', book['title'])
-    book['author'] = request.json.get('author', book['author'])
+    # Update the book's title and author if provided in the request; other keys are ignored
+    book = books.update(book_id, **{field: request.json[field] for field in BOOK_FIELDS if field in request.json})
+    if book is None:
+        # Deleted by another request since it was looked up
+        abort(404)
     return jsonify({'book': book})
 
 # Route to delete a book
@@ -85,12 +179,10 @@ def delete_book(book_id):
     """
     Delete a book by ID.
     """
-    # Find the book to delete
-    book = next((book for book in books if book['id'] == book_id), None)
-    if book is None:
+    # Delete the book by its ID
+    if not books.delete(book_id):
         # If the book is not found, return a 404 response
         abort(404)
-    books.remove(book)
     # Return an empty response with 204 No Content status
     return '', 204
 
@@ -0,0 +1,84 @@
+# Result cache for the CSV tasks, keyed by file content
+#
+# Uploads are stored under their SHA-256 (see uploads.py), so the result of
+# an operation on a column is fully determined by (sha256, operation,
+# column). Results are kept in SQLite so the web server and the Celery
+# workers share them, and the least recently used entries are evicted once
+# the cache holds more than max_entries results.
+
+import json
+import os
+import sys
+import time
+
+# Per-thread SQLite connections are shared with the stores at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from sqlite_connections import ThreadConnections, connect_wal
+
+DEFAULT_PATH = os.getenv(
+    'RESULT_CACHE_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results.sqlite3'),
+)
+MAX_ENTRIES = int(os.getenv('RESULT_CACHE_SIZE', 1000))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    sha256 TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    column_name TEXT NOT NULL,
+    result TEXT NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (sha256, operation, column_name)
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+'''
+
+
+class ResultCache:
+    """
+    (sha256, operation, column) -> JSON-serialisable task result.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._connections = ThreadConnections(lambda: connect_wal(self.path))
+        with self._connection() as db:
+            db.executescript(SCHEMA)
+
+    def _connection(self):
+        return self._connections.get()
+
+    def get(self, sha256, operation, column):
+        """
+        Stored result, or None. A hit marks the entry as recently used.
+        """
+        key = (sha256, operation, column)
+        with self._connection() as db:
+            row = db.execute(
+                'SELECT result FROM results WHERE sha256 = ? AND operation = ? AND column_name = ?', key
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute('UPDATE results SET last_used = ? WHERE sha256 = ? AND operation = ? AND column_name = ?',
+                       (time.time(), *key))
+        return json.loads(row[0])
+
+    def put(self, sha256, operation, column, result):
+        """
+        Store a result and evict the least recently used entries over the limit.
+        """
+        with self._connection() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO results (sha256, operation, column_name, result, last_used) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (sha256, operation, column, json.dumps(result), time.time()),
+            )
+            db.execute(
+                'DELETE FROM results WHERE rowid IN '
+                '(SELECT rowid FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,),
+            )
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM results').fetchone()[0]
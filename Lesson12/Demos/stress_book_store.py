@@ -0,0 +1,187 @@
+# Multithreaded stress test of the book stores
+# Run it with: python stress_book_store.py --readers 8 --writers 4 --duration 10
+#
+# Writer threads create, update and delete books while reader threads get,
+# page through and search them. Every write stores the same version tag in a
+# book's title and author, so a reader that sees two different tags has
+# caught a half-applied update. A few pinned books are never deleted and keep
+# a unique token in their title through every update, so a search for the
+# token must always find them. At the end the script checks that:
+#   - no thread raised and no read was torn
+#   - every created id is unique
+#   - the store holds exactly the books that were created and not deleted
+#   - every search result really matches its query
+#   - no search missed a pinned book
+# and reports reads and writes per second.
+
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from book_store import InMemoryBookStore, SQLiteBookStore
+from text_index import normalise
+
+PINNED_BOOKS = 20
+
+
+def tag(book):
+    return book['title'].split()[0], book['author'].split()[0]
+
+
+def check_book(book, errors):
+    title_tag, author_tag = tag(book)
+    if title_tag != author_tag:
+        errors.append(f'torn read of book {book["id"]}: {book}')
+
+
+class Stress:
+    def __init__(self, store, seed):
+        self.store = store
+        self.seed = seed
+        self.stop = threading.Event()
+        self.errors = []
+        self.created = []
+        self.deleted = []
+        self.reads = 0
+        self.writes = 0
+        self._versions = itertools.count()
+        self._lock = threading.Lock()
+        # id -> token that stays in the book's title
+        self.pinned = {}
+        for n in range(PINNED_BOOKS):
+            token = f'pin{n:04d}x'
+            version = f'v{next(self._versions)}'
+            book = self.store.create(f'{version} Title 0 {token}', f'{version} Author')
+            self.pinned[book['id']] = token
+            self.created.append(book['id'])
+        self.pinned_ids = list(self.pinned)
+
+    def writer(self, n):
+        rng = random.Random(self.seed * 1000 + n)
+        mine = []
+        writes = 0
+        while not self.stop.is_set():
+            version = f'v{next(self._versions)}'
+            action = rng.random()
+            if action < 0.5 or not mine:
+                book = self.store.create(f'{version} Title {rng.randrange(1000)}', f'{version} Author')
+                mine.append(book['id'])
+                with self._lock:
+                    self.created.append(book['id'])
+            elif action < 0.7:
+                self.store.update(rng.choice(mine), title=f'{version} Title {rng.randrange(1000)}',
+                                  author=f'{version} Author')
+            elif action < 0.85:
+                # Pinned books change on every update but keep their token
+                book_id = rng.choice(self.pinned_ids)
+                self.store.update(book_id, title=f'{version} Title {rng.randrange(1000)} {self.pinned[book_id]}',
+                                  author=f'{version} Author')
+            else:
+                book_id = mine.pop(rng.randrange(len(mine)))
+                if not self.store.delete(book_id):
+                    self.errors.append(f'delete of own book {book_id} failed')
+                with self._lock:
+                    self.deleted.append(book_id)
+            writes += 1
+        with self._lock:
+            self.writes += writes
+
+    def reader(self, n):
+        rng = random.Random(self.seed * 1000 + 500 + n)
+        reads = 0
+        while not self.stop.is_set():
+            action = rng.random()
+            if action < 0.6:
+                book = self.store.get(rng.randint(1, max(len(self.created), 1)))
+                if book is not None:
+                    check_book(book, self.errors)
+            elif action < 0.7:
+                page = self.store.page(rng.randint(0, max(len(self.created), 1)), 20)
+                ids = [book['id'] for book in page]
+                if ids != sorted(ids):
+                    self.errors.append(f'page out of order: {ids}')
+                for book in page:
+                    check_book(book, self.errors)
+            elif action < 0.85:
+                query = f'Title {rng.randrange(1000)}'
+                for book in self.store.page(0, 50, title=query):
+                    check_book(book, self.errors)
+                    if normalise(query) not in normalise(book['title']):
+                        self.errors.append(f'{book} does not match {query!r}')
+            else:
+                # The pinned book matches before and after every write, so it must be found
+                book_id = rng.choice(self.pinned_ids)
+                token = self.pinned[book_id]
+                match = rng.choice(('substring', 'word'))
+                found = [book['id'] for book in self.store.page(0, 50, title=token, match=match)]
+                if found != [book_id]:
+                    self.errors.append(f'{match} search for {token!r} returned {found}, expected [{book_id}]')
+            reads += 1
+        with self._lock:
+            self.reads += reads
+
+    def run(self, readers, writers, duration):
+        threads = [threading.Thread(target=self.guard(self.writer), args=(n,)) for n in range(writers)]
+        threads += [threading.Thread(target=self.guard(self.reader), args=(n,)) for n in range(readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        self.stop.set()
+        for thread in threads:
+            thread.join()
+
+    def guard(self, target):
+        def run(n):
+            try:
+                target(n)
+            except Exception as e:
+                self.errors.append(f'{target.__name__} {n} raised {e!r}')
+                self.stop.set()
+        return run
+
+    def verify(self):
+        if len(set(self.created)) != len(self.created):
+            self.errors.append('duplicate ids were allocated')
+        expected = set(self.created) - set(self.deleted)
+        stored = {book['id'] for book in self.store.all()}
+        if stored != expected:
+            self.errors.append(f'{len(stored ^ expected)} ids differ between the store and the writers')
+        if len(self.store) != len(expected):
+            self.errors.append(f'len() is {len(self.store)}, expected {len(expected)}')
+
+
+def make(kind, tmp):
+    if kind == 'memory':
+        return InMemoryBookStore()
+    return SQLiteBookStore(path=os.path.join(tmp, 'books.sqlite3'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stress test the book stores with concurrent readers and writers')
+    parser.add_argument('--stores', nargs='+', default=['memory', 'sqlite'], choices=['memory', 'sqlite'])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # Switch threads often to provoke interleavings
+    sys.setswitchinterval(1e-5)
+    failed = False
+    for kind in args.stores:
+        with tempfile.TemporaryDirectory() as tmp:
+            stress = Stress(make(kind, tmp), args.seed)
+            stress.run(args.readers, args.writers, args.duration)
+            stress.verify()
+        print(f'{kind:7s} {stress.reads / args.duration:9.0f} reads/s  {stress.writes / args.duration:8.0f} writes/s  '
+              f'{len(stress.created)} created, {len(stress.deleted)} deleted  '
+              f'{"OK" if not stress.errors else f"{len(stress.errors)} errors"}')
+        for error in stress.errors[:10]:
+            print('  ' + error)
+        failed = failed or bool(stress.errors)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,136 @@
+# Search indexes over one text field of the books
+#
+# Two indexes are kept per field:
+#   words   normalised token -> ids, for whole-word queries
+#   grams   every substring of 1 to 3 characters -> ids, for substring queries
+# A query of up to 3 characters is answered by its own postings. A longer one
+# intersects the postings of its trigrams, smallest first, and checks the few
+# remaining candidates. Either way its cost depends on the query and the
+# number of matches, not on the size of the catalogue.
+#
+# Writers must be serialised by the caller. Readers may run concurrently:
+# they only copy or intersect whole sets and dicts, which is atomic in
+# CPython, and they skip ids removed meanwhile. Re-indexing a document adds
+# its new postings before it drops the stale ones, so a query that matches
+# both the old and the new text finds the document throughout.
+
+import re
+import unicodedata
+
+GRAM_SIZE = 3
+
+WORD_RE = re.compile(r'\w+')
+
+
+def normalise(text):
+    """
+    Case-insensitive form of a field or query.
+    """
+    return unicodedata.normalize('NFKC', text).casefold()
+
+
+def words(text):
+    return set(WORD_RE.findall(normalise(text)))
+
+
+def grams(text, size=GRAM_SIZE):
+    """
+    All substrings of text of 1 to size characters.
+    """
+    return {text[i:i + n] for n in range(1, size + 1) for i in range(len(text) - n + 1)}
+
+
+def index_entry(text):
+    """
+    (normalised text, words, grams) of a field, as TextIndex.add() takes
+    it; raises TypeError if text is not a string.
+    """
+    text = normalise(text)
+    return text, words(text), grams(text)
+
+
+def _add(index, keys, doc_id):
+    for key in keys:
+        index.setdefault(key, set()).add(doc_id)
+
+
+def _remove(index, keys, doc_id):
+    for key in keys:
+        postings = index.get(key)
+        if postings is not None:
+            postings.discard(doc_id)
+            if not postings:
+                del index[key]
+
+
+def _intersect(postings):
+    """
+    Intersection of posting sets, smallest first; empty if any is missing.
+    """
+    if not postings or any(p is None for p in postings):
+        return set()
+    postings = sorted(postings, key=len)
+    result = set(postings[0])
+    for p in postings[1:]:
+        result &= p
+        if not result:
+            break
+    return result
+
+
+class TextIndex:
+    """
+    Word and n-gram index of one field, keyed by document id.
+    """
+
+    def __init__(self):
+        self.words = {}
+        self.grams = {}
+        self.texts = {}
+
+    def add(self, doc_id, entry):
+        """
+        Index a document given its index_entry(), replacing any text indexed
+        for it before. This only updates dicts and sets, so it cannot fail
+        halfway.
+        """
+        text, doc_words, doc_grams = entry
+        old_text = self.texts.get(doc_id)
+        _add(self.words, doc_words, doc_id)
+        _add(self.grams, doc_grams, doc_id)
+        self.texts[doc_id] = text
+        if old_text is not None:
+            # Only the postings the new text no longer uses
+            _remove(self.words, words(old_text) - doc_words, doc_id)
+            _remove(self.grams, grams(old_text) - doc_grams, doc_id)
+
+    def remove(self, doc_id):
+        text = self.texts.pop(doc_id, None)
+        if text is None:
+            return
+        _remove(self.words, words(text), doc_id)
+        _remove(self.grams, grams(text), doc_id)
+
+    def search_words(self, query):
+        """
+        Ids whose text contains every word of query; all ids if it has none.
+        """
+        query_words = words(query)
+        if not query_words:
+            return set(self.texts)
+        return _intersect([self.words.get(word) for word in query_words])
+
+    def search_substring(self, query):
+        """
+        Ids whose text contains query, case-insensitively.
+        """
+        query = normalise(query)
+        if not query:
+            return set(self.texts)
+        if len(query) <= GRAM_SIZE:
+            # Short queries have postings of their own, which are exact
+            return set(self.grams.get(query, ()))
+        trigrams = [query[i:i + GRAM_SIZE] for i in range(len(query) - GRAM_SIZE + 1)]
+        candidates = _intersect([self.grams.get(gram) for gram in trigrams])
+        # Sharing all trigrams does not guarantee a match, so check the survivors
+        return {doc_id for doc_id in candidates if query in self.texts.get(doc_id, '')}
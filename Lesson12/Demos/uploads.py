@@ -0,0 +1,51 @@
+# Streaming CSV uploads for celery_app.py
+#
+# The request body is copied to disk in fixed-size chunks while its SHA-256 is
+# computed, so memory use stays constant whatever the upload size. The file
+# is stored under its content hash and tasks receive that path, not the data.
+# Uploading the same file twice keeps a single copy.
+
+import hashlib
+import os
+import tempfile
+
+UPLOAD_DIR = os.getenv(
+    'UPLOAD_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads'),
+)
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def save_stream(stream, upload_dir=UPLOAD_DIR, chunk_size=CHUNK_SIZE, max_bytes=None, suffix='.csv'):
+    """
+    Copy a file-like stream to upload_dir; returns (sha256 hex digest, path,
+    size, created), where created is False if the same content was already
+    stored. Raises UploadTooLarge once more than max_bytes have been read.
+    """
+    os.makedirs(upload_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    # The temporary file is in upload_dir so the final rename is atomic
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise UploadTooLarge(f'Upload exceeds {max_bytes} bytes')
+                digest.update(chunk)
+                f.write(chunk)
+        path = os.path.join(upload_dir, digest.hexdigest() + suffix)
+        created = not os.path.exists(path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return digest.hexdigest(), path, size, created
@@ -0,0 +1,127 @@
+# Locust-style load test for the weather dashboards against a stub upstream
+# Run it with: python bench_dashboard_load.py --app ex6 --users 50 --duration 15
+#
+# Starts the Open-Meteo stub (with artificial latency) and the dashboard in
+# subprocesses, then runs N simulated users that POST city lookups back to
+# back and reports throughput and p50/p90/p99 latency. By default the forecast
+# cache TTL is 0, so every request revalidates upstream.
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+EXAMPLES_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.join(EXAMPLES_DIR, '..', '..')
+CITIES = ['Berlin', 'London', 'Paris', 'Madrid', 'Rome', 'Vienna']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def app_command(app, port):
+    """
+    Server command for a dashboard: the threaded Flask dev server for the
+    sync apps, hypercorn for the async one.
+    """
+    if app == 'ex6':
+        return [sys.executable, '-m', 'hypercorn', 'ex6:app', '--bind', f'127.0.0.1:{port}']
+    return [sys.executable, '-m', 'flask', '--app', app, 'run', '--port', str(port), '--with-threads']
+
+
+async def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f'{url} did not come up within {timeout}s')
+
+
+async def user(base_url, deadline, latencies, errors):
+    """
+    One simulated user: POST lookups back to back until the deadline.
+    """
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await client.post('/', data={'city': random.choice(CITIES)})
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors.append(1)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+async def run_load(base_url, users, duration):
+    await wait_until_up(f'{base_url}/autocomplete')
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(user(base_url, deadline, latencies, errors) for _ in range(users)))
+    return latencies, errors, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test a weather dashboard against a stub upstream')
+    parser.add_argument('--app', choices=['ex4', 'ex5', 'ex6'], default='ex6')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--upstream-latency', type=float, default=0.05, help='seconds added by the stub per request')
+    parser.add_argument('--cache-ttl', type=float, default=0, help='forecast cache TTL inside the app')
+    args = parser.parse_args()
+
+    stub_port, app_port = free_port(), free_port()
+    stub_url = f'http://127.0.0.1:{stub_port}'
+    workdir = tempfile.mkdtemp()
+    env = dict(
+        os.environ,
+        OPEN_METEO_GEOCODING_URL=stub_url,
+        OPEN_METEO_FORECAST_URL=stub_url,
+        HTTP_CACHE_DIR=os.path.join(workdir, 'http_cache'),
+        HTTP_CACHE_TTL=str(args.cache_ttl),
+        GEOCODE_DB=os.path.join(workdir, 'geocode.sqlite3'),
+    )
+
+    processes = [
+        subprocess.Popen([sys.executable, os.path.join(ROOT_DIR, 'stub_open_meteo.py'),
+                          '--port', str(stub_port), '--latency', str(args.upstream_latency)],
+                         stdout=subprocess.DEVNULL),
+        subprocess.Popen(app_command(args.app, app_port), cwd=EXAMPLES_DIR, env=env,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL),
+    ]
+    try:
+        latencies, errors, elapsed = asyncio.run(run_load(f'http://127.0.0.1:{app_port}', args.users, args.duration))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    latencies.sort()
+    print(f'{args.app}: {args.users} users for {elapsed:.1f}s, upstream latency {args.upstream_latency * 1000:.0f} ms')
+    print(f'requests: {len(latencies)} ok, {len(errors)} failed ({len(latencies) / elapsed:.1f} req/s)')
+    print(f'latency:  p50 {percentile(latencies, 0.50) * 1000:.1f} ms  '
+          f'p90 {percentile(latencies, 0.90) * 1000:.1f} ms  '
+          f'p99 {percentile(latencies, 0.99) * 1000:.1f} ms')
@@ -1,23 +1,24 @@
 # app.py
-import requests
-from flask import Flask, render_template, request
+from flask import Flask, render_template, request, jsonify
 
-app = Flask(__name__)
+from weather_api import geocode, fetch_forecast, autocomplete
+
+# Templates live in ./Templates (capitalised), which the default 'templates' misses on case-sensitive filesystems
+app = Flask(__name__, template_folder='Templates')
 
 @app.route('/', methods=['GET', 'POST'])
 def weather():
     weather_data = None
     if request.method == 'POST':
         city = request.form['city']
-        # Geocoding to get latitude and longitude for the city using Open-Meteo's location API (or any public geocoding API)
-        geocoding_response = requests.get(f'https://geocoding-api.open-meteo.com/v1/search?name={city}')
+        # Geocoding to get latitude and longitude for the city (local geocode store first, then Open-Meteo's location API)
+        location = geocode(city)
         
-        if geocoding_response.status_code == 200 and geocoding_response.json().get('results'):
-            location = geocoding_response.json()['results'][0]
-            latitude, longitude = location['latitude'], location['longitude']
+        if location is not None:
+            latitude, longitude = location
             
             # Fetch weather data for the latitude and longitude
-            weather_response = requests.get(f'https://api.open-meteo.com/v1/forecast?latitude={latitude}&longitude={longitude}&current_weather=true')
+            weather_response = fetch_forecast(latitude, longitude, 'current_weather=true')
             
             if weather_response.status_code == 200:
                 weather_data = weather_response.json()['current_weather']
@@ -28,5 +29,10 @@ def weather():
             
     return render_template('weather.html', weather_data=weather_data)
 
+@app.route('/autocomplete')
+def city_autocomplete():
+    # City name suggestions from the local geocode store
+    return jsonify(autocomplete(request.args.get('q', '')))
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,70 @@
+# Async variant of the ex5 dashboard, built on Quart (the asyncio port of Flask)
+# Run it with: hypercorn ex6:app  (pip install quart httpx)
+#
+# Upstream calls are awaited on one shared, pooled httpx.AsyncClient, so
+# requests reuse keep-alive connections instead of paying TCP+TLS setup
+# twice per POST, and no worker thread is blocked during the round trip.
+# Local I/O (the SQLite geocode store, the disk cache) and graph rendering
+# run in worker threads, so they never stall the event loop.
+
+import asyncio
+import os
+
+from quart import Quart, request, render_template, jsonify
+
+from weather_api import lookup_forecast_async, make_async_client, autocomplete_async
+from weather_graphs import DEFAULT_HOURS, clamp_hours, forecast_query, city_metrics, generate_temperature_graph
+
+app = Quart(__name__, template_folder='Templates')
+
+@app.before_serving
+async def open_http_client():
+    # One connection pool for the lifetime of the server
+    app.http_client = make_async_client()
+    # PREWARM=1 refreshes the most requested cities in the background
+    if os.getenv('PREWARM'):
+        from prewarm import start_prewarm_thread
+        start_prewarm_thread()
+
+@app.after_serving
+async def close_http_client():
+    await app.http_client.aclose()
+
+@app.route('/', methods=['GET', 'POST'])
+async def weather():
+    weather_data = None
+    graph_filename = None
+    metrics = None
+    hours = DEFAULT_HOURS
+    if request.method == 'POST':
+        form = await request.form
+        city = form['city']
+        hours = clamp_hours(form.get('hours', DEFAULT_HOURS, type=int))
+
+        # Geocoding to get latitude and longitude for the city (local geocode store first, then Open-Meteo's location API)
+        # and fetch hourly forecast data for temperature, humidity and wind speed.
+        # Concurrent requests for the same city share one upstream lookup.
+        location, weather_response = await lookup_forecast_async(city, forecast_query(hours), app.http_client)
+
+        if location is not None:
+            if weather_response.status_code == 200:
+                weather_data = weather_response.json()
+                # Rendering is CPU-bound, so keep it off the event loop
+                graph_filename = await asyncio.to_thread(generate_temperature_graph, city, weather_data, hours)
+                metrics = city_metrics(city, weather_data, hours)
+            else:
+                weather_data = {'error': 'Unable to retrieve weather data.'}
+        else:
+            weather_data = {'error': 'City not found'}
+
+    return await render_template('dashboard.html', weather_data=weather_data, graph_filename=graph_filename,
+                                 metrics=metrics, hours=hours)
+
+@app.route('/autocomplete')
+async def city_autocomplete():
+    # City name suggestions from the local geocode store
+    return jsonify(await autocomplete_async(request.args.get('q', '')))
+
+
+if __name__ == '__main__':
+    app.run(debug=True)
@@ -0,0 +1,156 @@
+# Persistent local geocode store for the weather dashboards
+#
+# City names are highly repetitive, so resolved names are kept in a SQLite
+# table keyed by their normalised form. A small in-memory LRU "hot tier" sits
+# in front of SQLite, and the primary-key B-tree doubles as a prefix index for
+# autocomplete. Callers report every request for a city with count_request(),
+# which bumps a per-name hit counter used to rank suggestions and to find the
+# most requested cities.
+
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+
+# Per-thread SQLite connections are shared with the stores at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from sqlite_connections import ThreadConnections, connect_wal
+
+DEFAULT_PATH = os.getenv(
+    'GEOCODE_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'geocode.sqlite3'),
+)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS places (
+    name TEXT PRIMARY KEY,
+    display_name TEXT NOT NULL,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID
+'''
+
+
+def normalise_name(name):
+    """
+    Case-fold, strip and collapse whitespace so 'berlin ' and 'Berlin' match.
+    """
+    name = unicodedata.normalize('NFKC', name).casefold()
+    return re.sub(r'\s+', ' ', name).strip()
+
+
+class GeocodeStore:
+    """
+    Normalised city name -> (display name, latitude, longitude).
+    """
+
+    def __init__(self, path=DEFAULT_PATH, hot_size=1024, flush_every=100, flush_interval=5.0):
+        self.path = path
+        self.hot_size = hot_size
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._hot = OrderedDict()
+        self._pending_hits = Counter()
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._connections = ThreadConnections(lambda: connect_wal(self.path))
+        with self._connection() as db:
+            db.execute(SCHEMA)
+
+    def _connection(self):
+        return self._connections.get()
+
+    def _remember(self, name, place):
+        with self._lock:
+            self._hot[name] = place
+            self._hot.move_to_end(name)
+            while len(self._hot) > self.hot_size:
+                self._hot.popitem(last=False)
+
+    def _count_hit(self, name):
+        # Hits are buffered and written in batches to keep lookups read-only
+        with self._lock:
+            self._pending_hits[name] += 1
+            due = (sum(self._pending_hits.values()) >= self.flush_every
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush_hits()
+
+    def flush_hits(self):
+        """
+        Write buffered hit counts to SQLite.
+        """
+        with self._lock:
+            pending, self._pending_hits = self._pending_hits, Counter()
+            self._last_flush = time.monotonic()
+        if pending:
+            with self._connection() as db:
+                db.executemany('UPDATE places SET hits = hits + ? WHERE name = ?',
+                               [(count, name) for name, count in pending.items()])
+
+    def lookup(self, city):
+        """
+        (display_name, latitude, longitude) for a city, or None if unknown.
+        """
+        name = normalise_name(city)
+        with self._lock:
+            place = self._hot.get(name)
+            if place is not None:
+                self._hot.move_to_end(name)
+        if place is None:
+            row = self._connection().execute(
+                'SELECT display_name, latitude, longitude FROM places WHERE name = ?', (name,)
+            ).fetchone()
+            if row is None:
+                return None
+            place = tuple(row)
+            self._remember(name, place)
+        return place
+
+    def add(self, city, display_name, latitude, longitude):
+        """
+        Store a resolved city.
+        """
+        name = normalise_name(city)
+        with self._connection() as db:
+            db.execute(
+                'INSERT INTO places (name, display_name, latitude, longitude) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET display_name = excluded.display_name, '
+                'latitude = excluded.latitude, longitude = excluded.longitude',
+                (name, display_name, latitude, longitude),
+            )
+        self._remember(name, (display_name, latitude, longitude))
+
+    def count_request(self, city):
+        """
+        Count one request for a city towards its ranking.
+        """
+        self._count_hit(normalise_name(city))
+
+    def autocomplete(self, prefix, limit=10):
+        """
+        Display names of known cities starting with prefix, most requested first.
+        """
+        prefix = normalise_name(prefix)
+        if not prefix:
+            return []
+        # A range scan on the primary key is a prefix search on the B-tree
+        rows = self._connection().execute(
+            'SELECT display_name FROM places WHERE name >= ? AND name < ? ORDER BY hits DESC, name LIMIT ?',
+            (prefix, prefix + '\U0010ffff', limit),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def most_requested(self, limit=10):
+        """
+        (name, latitude, longitude) of the most requested cities, by hit count.
+        """
+        self.flush_hits()
+        rows = self._connection().execute(
+            'SELECT name, latitude, longitude FROM places ORDER BY hits DESC, name LIMIT ?', (limit,)
+        ).fetchall()
+        return [tuple(row) for row in rows]
@@ -0,0 +1,134 @@
+# Background pre-warming of the most requested cities
+#
+# The dashboards only fetch on demand, so the first user after each forecast
+# update would pay the full upstream latency. This module refreshes the
+# forecast, derived metrics and rendered graph of the top-N cities ahead of
+# time. Cities are ranked by the request counter in the geocode store.
+#
+# Two ways to run it:
+#   In-process:  PREWARM=1 python ex5.py   (or ex6; a daemon thread in the web server)
+#   Celery:      celery -A prewarm worker --beat --loglevel=info
+#                (uses the same Redis broker as Lesson12/Demos/celery_app.py)
+#
+# The HTTP cache and the graph files live on disk, so a Celery worker on the
+# same machine warms them for the web server too. The derived-metrics cache is
+# in memory and is only warmed by the in-process scheduler.
+
+import datetime
+import logging
+import os
+import threading
+import time
+
+from weather_api import geocode_store, fetch_forecast
+from weather_graphs import DEFAULT_HOURS, forecast_query, city_metrics, generate_temperature_graph
+
+PREWARM_TOP_N = int(os.getenv('PREWARM_TOP_N', 20))
+PREWARM_INTERVAL = float(os.getenv('PREWARM_INTERVAL', 600))
+# Graphs and metrics are keyed by forecast hour, so also run just after each hour starts
+HOUR_BOUNDARY_DELAY = 5
+
+logger = logging.getLogger(__name__)
+
+
+def warm_city(name, latitude, longitude, hours=DEFAULT_HOURS):
+    """
+    Revalidate one city's forecast, then compute its metrics and render its
+    graph. Returns True if the forecast could be fetched.
+    """
+    # ttl=0 revalidates with the upstream (a cheap 304 when nothing changed)
+    weather_response = fetch_forecast(latitude, longitude, forecast_query(hours), ttl=0)
+    if weather_response.status_code != 200:
+        return False
+    weather_data = weather_response.json()
+    city_metrics(name, weather_data, hours)
+    generate_temperature_graph(name, weather_data, hours)
+    return True
+
+
+def prewarm_top_cities(top_n=PREWARM_TOP_N, hours=DEFAULT_HOURS):
+    """
+    Warm the top_n most requested cities. Returns the names that were warmed.
+    """
+    warmed = []
+    for name, latitude, longitude in geocode_store.most_requested(top_n):
+        try:
+            if warm_city(name, latitude, longitude, hours):
+                warmed.append(name)
+        except Exception:
+            logger.exception('Pre-warming %s failed', name)
+    return warmed
+
+
+def seconds_until_next_run(interval=PREWARM_INTERVAL):
+    """
+    The regular interval, or less if the next hour starts sooner.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    next_hour = now.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
+    until_hour = (next_hour - now).total_seconds() + HOUR_BOUNDARY_DELAY
+    return min(interval, until_hour)
+
+
+class PrewarmScheduler(threading.Thread):
+    """
+    Daemon thread that pre-warms the top cities until stopped.
+    """
+
+    def __init__(self, top_n=PREWARM_TOP_N, interval=PREWARM_INTERVAL):
+        super().__init__(name='prewarm', daemon=True)
+        self.top_n = top_n
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            start = time.monotonic()
+            warmed = prewarm_top_cities(self.top_n)
+            logger.info('Pre-warmed %d cities in %.2fs', len(warmed), time.monotonic() - start)
+            self._stopped.wait(seconds_until_next_run(self.interval))
+
+    def stop(self):
+        self._stopped.set()
+
+
+def start_prewarm_thread(top_n=PREWARM_TOP_N, interval=PREWARM_INTERVAL):
+    """
+    Start the in-process scheduler and return it.
+    """
+    scheduler = PrewarmScheduler(top_n, interval)
+    scheduler.start()
+    return scheduler
+
+
+# --------------------
+# Celery
+# --------------------
+
+def make_celery():
+    """
+    Celery app with a beat schedule for prewarm_top_cities, configured like
+    Lesson12/Demos/celery_app.py (Redis as broker and result backend).
+    """
+    from celery import Celery
+    from celery.schedules import crontab
+
+    broker_url = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+    app = Celery('prewarm', broker=broker_url, backend=broker_url)
+
+    @app.task(name='prewarm.prewarm_top_cities')
+    def prewarm_task(top_n=PREWARM_TOP_N):
+        return prewarm_top_cities(top_n)
+
+    app.conf.beat_schedule = {
+        'prewarm-top-cities': {'task': 'prewarm.prewarm_top_cities', 'schedule': PREWARM_INTERVAL},
+        'prewarm-on-the-hour': {'task': 'prewarm.prewarm_top_cities', 'schedule': crontab(minute=0)},
+    }
+    return app
+
+
+try:
+    celery = make_celery()
+except ImportError:
+    # Celery is only needed for the worker mode
+    celery = None
@@ -0,0 +1,81 @@
+# Request coalescing ("single-flight") for identical upstream lookups
+#
+# When many requests ask for the same key at once, only the first one (the
+# leader) runs the call; the others wait and receive the leader's result or
+# exception. Once the call finishes the key is forgotten, so later requests
+# start a fresh call. SingleFlight is for threaded servers, AsyncSingleFlight
+# for asyncio ones.
+
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Thread-based single-flight group.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) unless a call for key is already in flight,
+        in which case wait for that call and share its outcome.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """
+    asyncio single-flight group; use one per event loop.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn, *args, **kwargs):
+        """
+        Await fn(*args, **kwargs) unless a call for key is already in flight,
+        in which case await that call instead.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._calls[key] = task
+            task.add_done_callback(lambda finished: self._forget(key, finished))
+        # Shield the shared task so one cancelled waiter does not cancel it for everyone
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
@@ -0,0 +1,169 @@
+# Open-Meteo lookups shared by the Lesson9 weather dashboards
+#
+# Geocoding goes through the local geocode store first and only falls back
+# to the remote geocoder for names it has never seen. Both remote APIs are
+# called through the shared on-disk HTTP cache at the repository root.
+# The base URLs can be pointed at a local stub (see stub_open_meteo.py).
+#
+# The *_async variants take a shared httpx.AsyncClient (see make_async_client)
+# so the async dashboard reuses pooled keep-alive connections. They run the
+# SQLite geocode store and the disk cache in worker threads so the event
+# loop is never blocked on local I/O.
+#
+# lookup_forecast() and lookup_forecast_async() coalesce concurrent identical
+# lookups, so a trending city costs one geocode+forecast pair, not hundreds.
+# Every request is still counted towards the city's ranking (see prewarm.py)
+# before it joins a shared lookup.
+
+import asyncio
+import os
+import sys
+
+import requests
+
+# The shared HTTP response cache lives at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from http_cache import cached_get, cached_aget
+from geocode_store import GeocodeStore, normalise_name
+from singleflight import SingleFlight, AsyncSingleFlight
+
+GEOCODING_URL = os.getenv('OPEN_METEO_GEOCODING_URL', 'https://geocoding-api.open-meteo.com')
+FORECAST_URL = os.getenv('OPEN_METEO_FORECAST_URL', 'https://api.open-meteo.com')
+
+# City coordinates practically never change, so keep geocoding answers for a day
+GEOCODING_TTL = 24 * 60 * 60
+
+# Connection pool of the shared async client
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+
+geocode_store = GeocodeStore()
+
+# Keep-alive connections for the threaded dashboards
+session = requests.Session()
+
+# In-flight lookups shared between concurrent requests
+_flights = SingleFlight()
+_async_flights = AsyncSingleFlight()
+
+
+def _stored_location(city):
+    place = geocode_store.lookup(city)
+    if place is None:
+        return None
+    display_name, latitude, longitude = place
+    return latitude, longitude
+
+
+def _remember_location(city, geocoding_response):
+    if geocoding_response.status_code != 200 or not geocoding_response.json().get('results'):
+        return None
+    location = geocoding_response.json()['results'][0]
+    geocode_store.add(city, location.get('name', city), location['latitude'], location['longitude'])
+    return location['latitude'], location['longitude']
+
+
+def geocode(city):
+    """
+    (latitude, longitude) for a city name, or None if it cannot be found.
+    """
+    geocode_store.count_request(city)
+    return _geocode(city)
+
+
+def _geocode(city):
+    location = _stored_location(city)
+    if location is not None:
+        return location
+    geocoding_response = cached_get(f'{GEOCODING_URL}/v1/search?name={city}', session=session, ttl=GEOCODING_TTL)
+    return _remember_location(city, geocoding_response)
+
+
+def fetch_forecast(latitude, longitude, query, ttl=None):
+    """
+    GET /v1/forecast for a location; query is the rest of the query string.
+    A ttl of 0 forces revalidation with the upstream.
+    """
+    return cached_get(f'{FORECAST_URL}/v1/forecast?latitude={latitude}&longitude={longitude}&{query}',
+                      session=session, ttl=ttl)
+
+
+def _lookup_forecast(city, query):
+    location = _geocode(city)
+    if location is None:
+        return None, None
+    latitude, longitude = location
+    return location, fetch_forecast(latitude, longitude, query)
+
+
+def lookup_forecast(city, query):
+    """
+    (location, forecast response) for a city; (None, None) if the city
+    cannot be found. Concurrent identical lookups share one upstream call.
+    """
+    geocode_store.count_request(city)
+    return _flights.do((normalise_name(city), query), _lookup_forecast, city, query)
+
+
+def make_async_client():
+    """
+    Pooled keep-alive HTTP client for the async dashboard; create one per
+    process at startup and close it at shutdown.
+    """
+    import httpx
+
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS)
+    return httpx.AsyncClient(limits=limits, timeout=30)
+
+
+async def geocode_async(city, client):
+    """
+    Async variant of geocode().
+    """
+    await asyncio.to_thread(geocode_store.count_request, city)
+    return await _geocode_async(city, client)
+
+
+async def _geocode_async(city, client):
+    location = await asyncio.to_thread(_stored_location, city)
+    if location is not None:
+        return location
+    geocoding_response = await cached_aget(f'{GEOCODING_URL}/v1/search?name={city}', client, ttl=GEOCODING_TTL)
+    return await asyncio.to_thread(_remember_location, city, geocoding_response)
+
+
+async def fetch_forecast_async(latitude, longitude, query, client):
+    """
+    Async variant of fetch_forecast().
+    """
+    return await cached_aget(f'{FORECAST_URL}/v1/forecast?latitude={latitude}&longitude={longitude}&{query}', client)
+
+
+async def _lookup_forecast_async(city, query, client):
+    location = await _geocode_async(city, client)
+    if location is None:
+        return None, None
+    latitude, longitude = location
+    return location, await fetch_forecast_async(latitude, longitude, query, client)
+
+
+async def lookup_forecast_async(city, query, client):
+    """
+    Async variant of lookup_forecast().
+    """
+    await asyncio.to_thread(geocode_store.count_request, city)
+    return await _async_flights.do((normalise_name(city), query), _lookup_forecast_async, city, query, client)
+
+
+def autocomplete(prefix, limit=10):
+    """
+    Known city names starting with prefix, most requested first.
+    """
+    return geocode_store.autocomplete(prefix, limit)
+
+
+async def autocomplete_async(prefix, limit=10):
+    """
+    Async variant of autocomplete().
+    """
+    return await asyncio.to_thread(autocomplete, prefix, limit)
@@ -0,0 +1,164 @@
+# Forecast graphs and derived metrics shared by the Lesson9 weather dashboards
+#
+# Each graph is drawn on its own Figure with the Agg canvas, so no pyplot
+# global state is shared between threads. Rendered graphs are cached under
+# static/graphs, named after a hash of (city, horizon, forecast hour), and
+# concurrent requests for the same graph share one render.
+
+import datetime
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import matplotlib.dates as mdates
+import numpy as np
+
+from geocode_store import normalise_name
+
+# Shared charting and metrics helpers live at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from chart_decimation import decimate
+from weather_metrics import compute_metrics, metric_summary
+
+# Forecast horizon limits (Open-Meteo serves up to 16 days) and the most
+# points a graph will plot, however long the horizon
+DEFAULT_HOURS = 24
+MAX_HOURS = 16 * 24
+MAX_GRAPH_POINTS = 500
+
+GRAPH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'graphs')
+GRAPH_MAX_AGE = 2 * 60 * 60
+os.makedirs(GRAPH_DIR, exist_ok=True)
+
+# One lock per graph key so concurrent requests for the same city share one render
+_graph_locks = {}
+_graph_locks_lock = threading.Lock()
+
+# Derived-metric summaries of recent forecasts, keyed like the graphs
+METRICS_CACHE_SIZE = 1024
+_metrics_cache = OrderedDict()
+_metrics_lock = threading.Lock()
+
+
+def clamp_hours(hours):
+    """
+    Keep a requested horizon within what Open-Meteo serves.
+    """
+    return min(max(hours or DEFAULT_HOURS, 1), MAX_HOURS)
+
+
+def forecast_query(hours):
+    """
+    Forecast query string for the hourly series the dashboards show.
+    """
+    forecast_days = -(-hours // 24)  # Round up to whole days
+    return f'hourly=temperature_2m,relative_humidity_2m,wind_speed_10m&forecast_days={forecast_days}&timezone=auto'
+
+
+def derived_metrics(weather_data):
+    """
+    Daily min/max/mean, dew point, heat index and wind chill for today.
+    """
+    hourly = weather_data['hourly']
+    metrics = compute_metrics(hourly['temperature_2m'], hourly['relative_humidity_2m'], hourly['wind_speed_10m'])
+    return metric_summary(metrics)
+
+
+def city_metrics(city, weather_data, hours=DEFAULT_HOURS):
+    """
+    derived_metrics() memoised per (city, horizon, forecast hour).
+    """
+    key = graph_key(city, hours)
+    with _metrics_lock:
+        metrics = _metrics_cache.get(key)
+        if metrics is not None:
+            _metrics_cache.move_to_end(key)
+            return metrics
+    metrics = derived_metrics(weather_data)
+    with _metrics_lock:
+        _metrics_cache[key] = metrics
+        while len(_metrics_cache) > METRICS_CACHE_SIZE:
+            _metrics_cache.popitem(last=False)
+    return metrics
+
+
+def graph_key(city, hours):
+    """
+    Cache key of a graph. Forecasts change at most hourly, so the current
+    UTC hour is part of the key.
+    """
+    forecast_hour = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H')
+    key = f'{normalise_name(city)}|{hours}|{forecast_hour}'
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+
+def generate_temperature_graph(city, weather_data, hours=DEFAULT_HOURS):
+    """
+    Static-relative filename of the temperature graph, rendering it only if
+    this city and hour have not been rendered yet.
+    """
+    key = graph_key(city, hours)
+    graph_filename = f'graphs/{key}.png'
+    graph_path = os.path.join(GRAPH_DIR, f'{key}.png')
+    if os.path.exists(graph_path):
+        return graph_filename
+
+    with _graph_locks_lock:
+        lock = _graph_locks.setdefault(key, threading.Lock())
+    with lock:
+        if not os.path.exists(graph_path):
+            # Write under a private name, then rename, so readers never see a partial file
+            tmp_path = f'{graph_path}.{threading.get_ident()}.tmp'
+            render_temperature_graph(weather_data, hours, tmp_path)
+            os.replace(tmp_path, graph_path)
+            prune_graphs()
+    with _graph_locks_lock:
+        _graph_locks.pop(key, None)
+    return graph_filename
+
+
+def prune_graphs():
+    """
+    Drop graphs from earlier forecast hours.
+    """
+    cutoff = time.time() - GRAPH_MAX_AGE
+    for name in os.listdir(GRAPH_DIR):
+        path = os.path.join(GRAPH_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def render_temperature_graph(weather_data, hours, graph_path):
+    """
+    Draw the temperature forecast for the next `hours` hours to a PNG file.
+    """
+    # Parse hourly temperature data
+    times = weather_data['hourly']['time'][:hours]
+    temperatures = np.asarray(weather_data['hourly']['temperature_2m'][:hours], dtype=float)
+
+    # Long horizons are decimated so render time stays flat as the horizon grows
+    keep = decimate(temperatures, MAX_GRAPH_POINTS)
+    time_points = [datetime.datetime.fromisoformat(times[i]) for i in keep]
+
+    # Plot temperature graph
+    fig = Figure(figsize=(10, 5))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.plot(time_points, temperatures[keep], marker='o' if len(keep) <= 48 else None, linestyle='-', color='b')
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M' if hours <= 24 else '%d %b %H:%M'))
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.set_xlabel(f'Time ({hours} hours)')
+    ax.set_ylabel('Temperature (°C)')
+    ax.set_title(f'Temperature Forecast for the Next {hours} Hours')
+    fig.tight_layout()
+
+    # Save plot as image
+    fig.savefig(graph_path, format='png')
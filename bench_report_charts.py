@@ -0,0 +1,63 @@
+# Benchmark: serial vs process-pool chart rendering for many reports
+# Run it with: python bench_report_charts.py --locations 500
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from generate_weather_report import chart_jobs, render_chart, CHARTS
+from stub_open_meteo import synthetic_forecast
+
+
+def synthetic_jobs(locations, output_dir):
+    """
+    render_chart() argument tuples for N synthetic locations x 3 charts.
+    An output_dir of None renders the charts in memory.
+    """
+    jobs = []
+    for index in range(locations):
+        data = synthetic_forecast(random.uniform(-60, 70), random.uniform(-180, 180))
+        location_dir = None
+        if output_dir is not None:
+            location_dir = os.path.join(output_dir, f'location_{index}')
+            os.makedirs(location_dir, exist_ok=True)
+        jobs.extend(chart_jobs(data['hourly'], location_dir))
+    return jobs
+
+
+def run_serial(jobs):
+    start = time.perf_counter()
+    for job in jobs:
+        render_chart(*job)
+    return time.perf_counter() - start
+
+
+def run_parallel(jobs, workers):
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Larger chunks amortise the pickling round trip per chart
+        list(executor.map(render_chart, *zip(*jobs), chunksize=8))
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serial vs parallel chart rendering')
+    parser.add_argument('--locations', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--in-memory', action='store_true', help='render PNGs into memory instead of files')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        jobs = synthetic_jobs(args.locations, None if args.in_memory else output_dir)
+        charts = args.locations * len(CHARTS)
+        print(f'{args.locations} locations x {len(CHARTS)} charts = {charts} charts')
+
+        serial = run_serial(jobs)
+        print(f'serial:   {serial:8.2f}s  ({charts / serial:7.1f} charts/s)')
+
+        parallel = run_parallel(jobs, args.workers)
+        print(f'parallel: {parallel:8.2f}s  ({charts / parallel:7.1f} charts/s) with {args.workers} workers')
+        print(f'speed-up: {serial / parallel:.2f}x')
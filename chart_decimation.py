@@ -0,0 +1,91 @@
+# Point decimation before plotting
+#
+# Long forecast horizons and historical ranges produce far more points than
+# a chart has pixels. These helpers pick a subset of indices that keeps the
+# shape of the series so render time and PDF size stay flat as the horizon
+# grows:
+#
+#   lttb    Largest-Triangle-Three-Buckets: keeps the visually significant
+#           point of each bucket; best for line charts.
+#   minmax  keeps the minimum and maximum of each bucket, so no peak is lost.
+#
+# Both return sorted indices into the original series so the caller can
+# apply them to time labels as well as values. NaN readings are skipped.
+
+import numpy as np
+
+DEFAULT_MAX_POINTS = 1000
+
+
+def lttb_indices(y, threshold, x=None):
+    """
+    Indices selected by Largest-Triangle-Three-Buckets.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        # No room for a bucket: keep the end points
+        return np.array([0, n - 1][:max(threshold, 0)], dtype=np.int64)
+    x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+    # The first and last points are always kept; the points in between are
+    # split into threshold - 2 buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        # Average of the next bucket is the third corner of the triangle
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def minmax_indices(y, max_points):
+    """
+    Indices of the minimum and maximum of each bucket, plus both end points.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    buckets = (max_points - 2) // 2
+    if max_points >= n:
+        return np.arange(n)
+    if buckets < 1:
+        # No room for a bucket: keep the end points
+        return np.array([0, n - 1][:max(max_points, 0)], dtype=np.int64)
+
+    bucket_ids = np.arange(n) * buckets // n
+    # Sort by bucket, then by value: the first entry of each bucket is its
+    # minimum and the last is its maximum
+    order = np.lexsort((y, bucket_ids))
+    starts = np.searchsorted(bucket_ids[order], np.arange(buckets))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([[0, n - 1], order[starts], order[ends]]))
+
+
+def decimate(y, max_points=DEFAULT_MAX_POINTS, method='lttb'):
+    """
+    Sorted indices of at most max_points points of y worth plotting.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= max_points:
+        return valid
+    if method == 'minmax':
+        picked = minmax_indices(y[valid], max_points)
+    elif method == 'lttb':
+        picked = lttb_indices(y[valid], max_points)
+    else:
+        raise ValueError(f'Unknown decimation method: {method}')
+    return valid[picked]
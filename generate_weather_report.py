@@ -1,86 +1,291 @@
+import argparse
+import hashlib
+import io
 import json
-import matplotlib.pyplot as plt
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# The object-oriented Figure/Agg API keeps no global pyplot state, so charts
+# can be rendered side by side in worker processes
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from fpdf import FPDF
+import numpy as np
+
+from chart_decimation import decimate, DEFAULT_MAX_POINTS
+
+from weather_metrics import compute_metrics, metric_summary
+from weather_store import load_weather_data, is_columnar
+
+# Input hashes of the reports already built, kept next to the PDFs
+MANIFEST_FILE = '.report_manifest.json'
+
+# One entry per chart: (hourly series, legend label, y-axis label, title, colour, file name)
+CHARTS = [
+    ('temperature_2m', 'Temperature (°C)', 'Temperature (°C)', 'Temperature Over Time', 'red',
+     'temperature_plot.png'),
+    ('relative_humidity_2m', 'Relative Humidity (%)', 'Relative Humidity (%)', 'Humidity Over Time', 'blue',
+     'humidity_plot.png'),
+    ('wind_speed_10m', 'Wind Speed (m/s)', 'Wind Speed (m/s)', 'Wind Speed Over Time', 'green',
+     'wind_speed_plot.png'),
+]
+
+
+def render_chart(values, label, ylabel, title, color, output_path=None, max_points=DEFAULT_MAX_POINTS):
+    """
+    Render one time series to a PNG file and return its path. Without an
+    output path the PNG is rendered into memory and its bytes are returned.
+    Long series are decimated to at most max_points points first.
+    """
+    fig = Figure(figsize=(10, 5))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    # Time points (let's assume each hour corresponds to an index)
+    values = np.asarray(values, dtype=np.float64)
+    time_points = decimate(values, max_points)
+    ax.plot(time_points, values[time_points], label=label, color=color)
+    ax.set_xlabel('Time (Hours)')
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    ax.legend()
+    if output_path is None:
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png')
+        return buffer.getvalue()
+    fig.savefig(output_path)
+    return output_path
+
+
+def chart_jobs(hourly_data, output_dir='Output'):
+    """
+    Argument tuples for render_chart(), one per chart in CHARTS.
+    An output_dir of None renders the charts in memory.
+    """
+    return [
+        (hourly_data[series], label, ylabel, title, color,
+         None if output_dir is None else os.path.join(output_dir, filename))
+        for series, label, ylabel, title, color, filename in CHARTS
+    ]
+
+
+def create_graphs(hourly_data, output_dir='Output', executor=None):
+    """
+    Render the temperature, humidity and wind speed charts. With an executor
+    (e.g. a ProcessPoolExecutor) the charts are rendered in parallel.
+    Returns the chart paths in CHARTS order, or the PNG bytes when
+    output_dir is None.
+    """
+    jobs = chart_jobs(hourly_data, output_dir)
+    if executor is None:
+        return [render_chart(*job) for job in jobs]
+    return list(executor.map(render_chart, *zip(*jobs)))
+
+
+# Labels for the derived-metrics page, in display order
+SUMMARY_LABELS = [
+    ('temperature_min', 'Day 1 minimum temperature (°C)'),
+    ('temperature_max', 'Day 1 maximum temperature (°C)'),
+    ('temperature_mean', 'Day 1 mean temperature (°C)'),
+    ('dew_point', 'Dew point, first hour (°C)'),
+    ('heat_index_max', 'Highest heat index (°C)'),
+    ('wind_chill_min', 'Lowest wind chill (°C)'),
+]
+
+
+def summarise(hourly_data):
+    """
+    Derived-metric summary for one location's hourly data.
+    """
+    metrics = compute_metrics(
+        hourly_data['temperature_2m'], hourly_data['relative_humidity_2m'], hourly_data['wind_speed_10m']
+    )
+    return metric_summary(metrics)
+
+
+def build_pdf(charts, output_path, summary=None):
+    """
+    Assemble the PDF report from the rendered charts, given either as file
+    paths or as in-memory PNG bytes, plus an optional derived-metrics page.
+    """
+    temperature_plot, humidity_plot, wind_speed_plot = [
+        io.BytesIO(chart) if isinstance(chart, bytes) else chart
+        for chart in charts
+    ]
+
+    # Create a PDF report
+    pdf = FPDF()
+
+    # Add a page
+    pdf.add_page()
+
+    # Title
+    pdf.set_font('Arial', 'B', 16)
+    pdf.cell(40, 10, 'Weather Data Report')
+
+    # Add text
+    pdf.set_font('Arial', '', 12)
+    pdf.ln(20)  # Line break
+    pdf.multi_cell(0, 10, "This report contains the weather data scraped from Open-Meteo API.")
+
+    # Add the temperature graph
+    pdf.ln(10)
+    pdf.cell(40, 10, 'Temperature Over Time:')
+    pdf.image(temperature_plot, x=10, y=40, w=190)
+
+    # Add the humidity graph
+    pdf.add_page()
+    pdf.cell(40, 10, 'Humidity Over Time:')
+    pdf.image(humidity_plot, x=10, y=40, w=190)
+
+    # Add the wind speed graph
+    pdf.add_page()
+    pdf.cell(40, 10, 'Wind Speed Over Time:')
+    pdf.image(wind_speed_plot, x=10, y=40, w=190)
+
+    # Add the derived metrics
+    if summary:
+        pdf.add_page()
+        pdf.cell(40, 10, 'Derived Metrics:')
+        pdf.ln(15)
+        for key, label in SUMMARY_LABELS:
+            if key in summary:
+                pdf.cell(100, 10, label)
+                pdf.cell(40, 10, f'{summary[key]:.1f}')
+                pdf.ln(10)
+
+    # Save the PDF
+    pdf.output(output_path)
+
+
+# --------------------
+# Batch Reports
+# --------------------
+
+def find_datasets(input_dir):
+    """
+    Map report name -> dataset path for every JSON file and columnar
+    dataset directory in input_dir.
+    """
+    datasets = {}
+    for name in sorted(os.listdir(input_dir)):
+        path = os.path.join(input_dir, name)
+        if name.endswith('.json') and os.path.isfile(path):
+            datasets[name[:-len('.json')]] = path
+        elif is_columnar(path):
+            datasets[name] = path
+    return datasets
+
+
+def dataset_hash(path):
+    """
+    SHA-256 over a dataset file, or over every file of a dataset directory.
+    """
+    digest = hashlib.sha256()
+    paths = [path] if os.path.isfile(path) else [
+        os.path.join(path, name) for name in sorted(os.listdir(path))
+    ]
+    for file_path in paths:
+        digest.update(os.path.basename(file_path).encode('utf-8'))
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def build_report(data_path, output_path):
+    """
+    Build one PDF report from one dataset, with charts rendered in memory.
+    """
+    data = load_weather_data(data_path)
+    charts = create_graphs(data['hourly'], output_dir=None)
+    build_pdf(charts, output_path, summarise(data['hourly']))
+    return output_path
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def build_reports(input_dir, output_dir, workers=None, force=False):
+    """
+    Build one PDF per dataset in input_dir, skipping datasets whose input
+    hash matches the last build. Reports are built in parallel worker
+    processes. Returns (built, skipped, failed) lists of report names.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    built, skipped, failed = [], [], []
+
+    pending = {}
+    for name, path in find_datasets(input_dir).items():
+        digest = dataset_hash(path)
+        output_path = os.path.join(output_dir, f'{name}.pdf')
+        if not force and manifest.get(name) == digest and os.path.exists(output_path):
+            skipped.append(name)
+        else:
+            pending[name] = (path, output_path, digest)
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(build_report, path, output_path): name
+                for name, (path, output_path, digest) in pending.items()
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    future.result()
+                except Exception as exc:
+                    print(f"Failed to build report {name}: {exc}")
+                    failed.append(name)
+                    continue
+                manifest[name] = pending[name][2]
+                built.append(name)
+        save_manifest(output_dir, manifest)
+
+    return built, skipped, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate the weather PDF report')
+    parser.add_argument('data_path', nargs='?', default='weather_data.json',
+                        help='JSON file or columnar .npy dataset directory')
+    parser.add_argument('--in-memory', action='store_true',
+                        help='embed the charts straight from memory instead of writing Output/*.png')
+    parser.add_argument('--input-dir', help='build one report per dataset in this directory (batch mode)')
+    parser.add_argument('--output-dir', default='Output/reports', help='where batch mode writes the PDFs')
+    parser.add_argument('--workers', type=int, help='worker processes for batch mode (default: all cores)')
+    parser.add_argument('--force', action='store_true', help='rebuild every report even if its input is unchanged')
+    args = parser.parse_args()
+
+    if args.input_dir:
+        built, skipped, failed = build_reports(args.input_dir, args.output_dir, args.workers, args.force)
+        print(f"Built {len(built)} reports, skipped {len(skipped)} unchanged, {len(failed)} failed.")
+        return
+
+    # Load the weather data from a JSON file or a columnar .npy dataset directory.
+    # Columnar series are memory-mapped rather than parsed into Python lists.
+    data = load_weather_data(args.data_path)
+
+    # Render the three charts in parallel worker processes
+    with ProcessPoolExecutor(max_workers=len(CHARTS)) as executor:
+        charts = create_graphs(data['hourly'], None if args.in_memory else 'Output', executor)
+
+    build_pdf(charts, "Output/weather_report.pdf", summarise(data['hourly']))
+
+    print("Weather report PDF generated successfully!")
+
 
-# Load the weather data from the JSON file
-with open('weather_data.json', 'r') as f:
-    data = json.load(f)
-
-# Extract the hourly data for temperature, humidity, and wind speed
-hourly_data = data['hourly']
-temperature = hourly_data['temperature_2m']
-humidity = hourly_data['relative_humidity_2m']
-wind_speed = hourly_data['wind_speed_10m']
-
-# Time points (let's assume each hour corresponds to an index)
-time_points = range(len(temperature))
-
-# Create a function to generate graphs
-def create_graphs():
-    # Temperature plot
-    plt.figure(figsize=(10, 5))
-    plt.plot(time_points, temperature, label='Temperature (°C)', color='red')
-    plt.xlabel('Time (Hours)')
-    plt.ylabel('Temperature (°C)')
-    plt.title('Temperature Over Time')
-    plt.legend()
-    plt.savefig("Output/temperature_plot.png")
-    plt.close()
-
-    # Humidity plot
-    plt.figure(figsize=(10, 5))
-    plt.plot(time_points, humidity, label='Relative Humidity (%)', color='blue')
-    plt.xlabel('Time (Hours)')
-    plt.ylabel('Relative Humidity (%)')
-    plt.title('Humidity Over Time')
-    plt.legend()
-    plt.savefig("Output/humidity_plot.png")
-    plt.close()
-
-    # Wind speed plot
-    plt.figure(figsize=(10, 5))
-    plt.plot(time_points, wind_speed, label='Wind Speed (m/s)', color='green')
-    plt.xlabel('Time (Hours)')
-    plt.ylabel('Wind Speed (m/s)')
-    plt.title('Wind Speed Over Time')
-    plt.legend()
-    plt.savefig("Output/wind_speed_plot.png")
-    plt.close()
-
-# Generate the graphs
-create_graphs()
-
-# Create a PDF report
-pdf = FPDF()
-
-# Add a page
-pdf.add_page()
-
-# Title
-pdf.set_font('Arial', 'B', 16)
-pdf.cell(40, 10, 'Weather Data Report')
-
-# Add text
-pdf.set_font('Arial', '', 12)
-pdf.ln(20)  # Line break
-pdf.multi_cell(0, 10, "This report contains the weather data scraped from Open-Meteo API.")
-
-# Add the temperature graph
-pdf.ln(10)
-pdf.cell(40, 10, 'Temperature Over Time:')
-pdf.image("Output/temperature_plot.png", x=10, y=40, w=190)
-
-# Add the humidity graph
-pdf.add_page()
-pdf.cell(40, 10, 'Humidity Over Time:')
-pdf.image("Output/humidity_plot.png", x=10, y=40, w=190)
-
-# Add the wind speed graph
-pdf.add_page()
-pdf.cell(40, 10, 'Wind Speed Over Time:')
-pdf.image("Output/wind_speed_plot.png", x=10, y=40, w=190)
-
-# Save the PDF
-pdf.output("Output/weather_report.pdf")
-
-print("Weather report PDF generated successfully!")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+# Shared on-disk HTTP response cache for the Open-Meteo call sites
+#
+# Responses are stored one file per normalised URL. A fresh entry (younger
+# than its TTL) is served without touching the network; a stale entry is
+# revalidated with If-None-Match / If-Modified-Since and a 304 just renews it.
+# A small in-memory tier in front of the disk serves repeated lookups in the
+# same process without any I/O. Least recently used entries are evicted once
+# the cache grows past max_entries.
+#
+# The number of entries is tracked in memory, so a store does not list the
+# directory. Once it passes max_entries, the least recently used entries are
+# removed in one pass until EVICT_TO of max_entries remain, so the scan is
+# paid once per batch of stores rather than on every store.
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+
+DEFAULT_CACHE_DIR = os.getenv(
+    'HTTP_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.http_cache'),
+)
+DEFAULT_TTL = float(os.getenv('HTTP_CACHE_TTL', 900))  # Open-Meteo models update at most hourly
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+EVICT_TO = 0.9  # Share of max_entries kept after an eviction pass
+
+
+def normalise_url(url):
+    """
+    Canonical form of a URL used as the cache key: lower-case scheme and
+    host, no default port, no fragment and sorted query parameters.
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{parts.port}'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+
+class CachedResponse:
+    """
+    The subset of requests.Response the call sites use.
+    """
+
+    def __init__(self, status_code, content, headers, from_cache=False):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.from_cache = from_cache
+        self._json = None
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def json(self):
+        if self._json is None:
+            self._json = json.loads(self.content)
+        return self._json
+
+
+class HTTPCache:
+    """
+    On-disk response cache with TTLs, conditional revalidation and LRU eviction.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, max_entries=5000, memory_entries=256):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Other processes sharing the directory are only seen at the next eviction
+        self._entries = len(self._entry_names())
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    def _load(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _store(self, key, entry):
+        self._remember(key, entry)
+        # Write to a temporary file first so readers never see a partial entry
+        path = self._path(key)
+        new_file = not os.path.exists(path)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if new_file:
+                self._entries += 1
+            full = self._entries > self.max_entries
+        if full:
+            self._evict()
+
+    def _touch(self, key, now):
+        # The file mtime doubles as the last-access time for LRU eviction.
+        # Refreshing it once a minute is precise enough and keeps hits I/O free.
+        if now - self._touched.get(key, 0) < 60:
+            return
+        self._touched[key] = now
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+    def _entry_names(self):
+        try:
+            return [name for name in os.listdir(self.directory) if name.endswith('.json')]
+        except OSError:
+            return []
+
+    def _evict(self):
+        # One thread trims at a time; the others carry on storing
+        if not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            names = self._entry_names()
+            excess = len(names) - int(self.max_entries * EVICT_TO)
+            paths = [os.path.join(self.directory, name) for name in names]
+            if excess > 0:
+                paths.sort(key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0)
+            for path in paths[:max(excess, 0)]:
+                key = os.path.basename(path)[:-len('.json')]
+                with self._lock:
+                    self._memory.pop(key, None)
+                    self._touched.pop(key, None)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            # Resynchronise with the directory, which other processes may share
+            with self._lock:
+                self._entries = len(names) - max(excess, 0)
+        finally:
+            self._evict_lock.release()
+
+    @staticmethod
+    def _response(entry, from_cache):
+        return CachedResponse(entry['status_code'], entry['body'].encode('utf-8'), entry['headers'], from_cache)
+
+    def _lookup(self, url, ttl):
+        """
+        (key, entry, fresh) for a URL; entry is None on a miss.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        key = hashlib.sha256(normalise_url(url).encode('utf-8')).hexdigest()
+        entry = self._load(key)
+        now = time.time()
+        fresh = entry is not None and now - entry['stored_at'] < ttl
+        if fresh:
+            self._touch(key, now)
+        return key, entry, fresh
+
+    @staticmethod
+    def _conditional_headers(entry):
+        headers = {}
+        if entry is not None:
+            if entry['headers'].get('ETag'):
+                headers['If-None-Match'] = entry['headers']['ETag']
+            if entry['headers'].get('Last-Modified'):
+                headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+        return headers
+
+    def _update(self, key, entry, url, response):
+        """
+        Apply an upstream response (requests or httpx) to the cache and
+        return what the caller should see.
+        """
+        now = time.time()
+        if response.status_code == 304 and entry is not None:
+            entry = dict(entry, stored_at=now)
+            self._store(key, entry)
+            return self._response(entry, from_cache=True)
+
+        if response.status_code == 200:
+            kept_headers = {
+                name: response.headers[name]
+                for name in ('ETag', 'Last-Modified', 'Content-Type')
+                if name in response.headers
+            }
+            self._store(key, {
+                'url': url,
+                'status_code': 200,
+                'headers': kept_headers,
+                'body': response.text,
+                'stored_at': now,
+            })
+        return response
+
+    def get(self, url, session=None, ttl=None, timeout=30):
+        """
+        GET a URL through the cache. Only 200 responses are cached; a stale
+        entry is still served if revalidation fails with a connection error.
+        """
+        key, entry, fresh = self._lookup(url, ttl)
+        if fresh:
+            return self._response(entry, from_cache=True)
+
+        try:
+            response = (session or requests).get(url, headers=self._conditional_headers(entry), timeout=timeout)
+        except requests.RequestException:
+            if entry is None:
+                raise
+            return self._response(entry, from_cache=True)
+        return self._update(key, entry, url, response)
+
+    async def aget(self, url, client, ttl=None):
+        """
+        Async variant of get() for a shared httpx.AsyncClient. Disk reads,
+        writes and evictions run in a worker thread, off the event loop.
+        """
+        import httpx
+
+        key, entry, fresh = await asyncio.to_thread(self._lookup, url, ttl)
+        if fresh:
+            return self._response(entry, from_cache=True)
+
+        try:
+            response = await client.get(url, headers=self._conditional_headers(entry))
+        except httpx.HTTPError:
+            if entry is None:
+                raise
+            return self._response(entry, from_cache=True)
+        return await asyncio.to_thread(self._update, key, entry, url, response)
+
+
+# Shared cache used by the scraper and the Lesson9 dashboards
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache():
+    """
+    Lazily create the process-wide cache.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = HTTPCache()
+        return _default_cache
+
+
+def cached_get(url, session=None, ttl=None, timeout=30):
+    """
+    requests.get() replacement backed by the shared on-disk cache.
+    """
+    return get_default_cache().get(url, session=session, ttl=ttl, timeout=timeout)
+
+
+async def cached_aget(url, client, ttl=None):
+    """
+    httpx.AsyncClient.get() replacement backed by the shared on-disk cache.
+    """
+    return await get_default_cache().aget(url, client, ttl=ttl)
@@ -1,20 +1,218 @@
-import requests
+import argparse
+import csv
 import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import HTTPCache, cached_get
+from weather_store import save_columnar
 
 # API URL for weather data (Berlin, for example)
 api_url = 'https://api.open-meteo.com/v1/forecast?latitude=52.52&longitude=13.41&hourly=temperature_2m,relative_humidity_2m,wind_speed_10m'
 
-# Fetch data from the API
-response = requests.get(api_url)
-
-# Check if the response is successful
-if response.status_code == 200:
-    data = response.json()
-    
-    # Save the data to a JSON file for further processing
-    with open("Output/weather_data.json", 'w') as f:
-        json.dump(data, f, indent=4)
-    
-    print("Weather data fetched successfully!")
-else:
-    print(f"Failed to fetch data. Status code: {response.status_code}")
\ No newline at end of file
+# Batch mode settings
+DEFAULT_BASE_URL = 'https://api.open-meteo.com'
+HOURLY_FIELDS = 'temperature_2m,relative_humidity_2m,wind_speed_10m'
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def forecast_url(latitude, longitude, base_url=DEFAULT_BASE_URL):
+    """
+    Build the forecast URL for one location.
+    """
+    return f'{base_url}/v1/forecast?latitude={latitude}&longitude={longitude}&hourly={HOURLY_FIELDS}'
+
+
+def save_weather_data(data, path, output_format='json'):
+    """
+    Save an API response as indented JSON or as a columnar .npy dataset.
+    """
+    if output_format == 'npy':
+        save_columnar(data, path)
+    else:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=4)
+
+
+def fetch_single(output_format='json'):
+    """
+    Fetch the Berlin forecast and save it to Output/weather_data.json
+    (or the Output/weather_data/ directory in npy format).
+    """
+    # Fetch data from the API (served from the shared cache while fresh)
+    response = cached_get(api_url)
+
+    # Check if the response is successful
+    if response.status_code == 200:
+        data = response.json()
+
+        # Save the data for further processing
+        path = "Output/weather_data" if output_format == 'npy' else "Output/weather_data.json"
+        save_weather_data(data, path, output_format)
+
+        print("Weather data fetched successfully!")
+    else:
+        print(f"Failed to fetch data. Status code: {response.status_code}")
+
+
+# --------------------
+# Batch Mode
+# --------------------
+
+class HostLimiter:
+    """
+    Caps the number of in-flight requests per host.
+    """
+
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+        with semaphore:
+            yield
+
+
+def fetch_with_retry(session, url, limiter, retries=3, backoff=0.5, cache=None):
+    """
+    GET a URL, retrying connection errors and retryable status codes with
+    exponential backoff and jitter. Returns the last response.
+    """
+    for attempt in range(retries + 1):
+        last_attempt = attempt == retries
+        try:
+            with limiter.slot(url):
+                if cache is not None:
+                    response = cache.get(url, session=session)
+                else:
+                    response = session.get(url, timeout=30)
+            if response.status_code not in RETRY_STATUS or last_attempt:
+                return response
+        except requests.RequestException:
+            if last_attempt:
+                raise
+        time.sleep(backoff * (2 ** attempt) + random.uniform(0, backoff))
+
+
+def location_output_path(output_dir, latitude, longitude, output_format='json'):
+    """
+    One output per location, named after its coordinates. The npy format
+    produces a dataset directory rather than a file.
+    """
+    name = f'weather_{latitude:.4f}_{longitude:.4f}'
+    if output_format == 'json':
+        name += '.json'
+    return os.path.join(output_dir, name)
+
+
+def read_locations(path):
+    """
+    Read (latitude, longitude) pairs from a CSV file. Lines that do not start
+    with a number (headers, comments) are skipped.
+    """
+    locations = []
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            try:
+                locations.append((float(row[0]), float(row[1])))
+            except (ValueError, IndexError):
+                continue
+    return locations
+
+
+def fetch_locations(locations, output_dir, base_url=DEFAULT_BASE_URL, workers=32, per_host=16, retries=3,
+                    output_format='json', cache=None):
+    """
+    Fetch forecasts for many locations concurrently over a shared connection
+    pool and write one output per location. Pass an HTTPCache to serve
+    unchanged forecasts locally.
+
+    Returns (succeeded, failed, elapsed_seconds) where failed is a list of
+    (latitude, longitude, reason).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    limiter = HostLimiter(per_host)
+    session = requests.Session()
+    # Keep enough pooled keep-alive connections for every worker
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def fetch_one(latitude, longitude):
+        url = forecast_url(latitude, longitude, base_url)
+        response = fetch_with_retry(session, url, limiter, retries, cache=cache)
+        if response.status_code != 200:
+            raise RuntimeError(f'status code {response.status_code}')
+        path = location_output_path(output_dir, latitude, longitude, output_format)
+        save_weather_data(response.json(), path, output_format)
+
+    succeeded, failed = 0, []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(fetch_one, lat, lon): (lat, lon) for lat, lon in locations}
+        for future in as_completed(futures):
+            latitude, longitude = futures[future]
+            try:
+                future.result()
+                succeeded += 1
+            except Exception as exc:
+                failed.append((latitude, longitude, str(exc)))
+    elapsed = time.perf_counter() - start
+    session.close()
+    return succeeded, failed, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fetch Open-Meteo forecasts')
+    parser.add_argument('--locations', help='CSV file of latitude,longitude pairs (enables batch mode)')
+    parser.add_argument('--output-dir', default='Output/locations')
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--per-host', type=int, default=16, help='max concurrent requests per host')
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--format', choices=['json', 'npy'], default='json',
+                        help='npy writes one typed .npy array per hourly series')
+    parser.add_argument('--no-cache', action='store_true', help='bypass the on-disk HTTP cache in batch mode')
+    parser.add_argument('--stub', type=int, metavar='N',
+                        help='fetch N synthetic locations from a local stub server instead of Open-Meteo')
+    args = parser.parse_args()
+
+    if not args.locations and not args.stub:
+        fetch_single(args.format)
+        return
+
+    base_url = args.base_url
+    if args.stub:
+        from stub_open_meteo import start_in_background
+        server, base_url = start_in_background()
+        locations = [(random.uniform(-60, 70), random.uniform(-180, 180)) for _ in range(args.stub)]
+    else:
+        locations = read_locations(args.locations)
+
+    cache = None if args.no_cache else HTTPCache()
+    succeeded, failed, elapsed = fetch_locations(
+        locations, args.output_dir, base_url, args.workers, args.per_host, args.retries, args.format, cache
+    )
+    for latitude, longitude, reason in failed:
+        print(f"Failed to fetch {latitude}, {longitude}: {reason}")
+    print(f"Fetched {succeeded}/{len(locations)} locations in {elapsed:.2f}s "
+          f"({succeeded / elapsed if elapsed else 0:.1f} locations/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# Per-thread SQLite connections shared by the SQLite-backed stores
+#
+# A sqlite3 connection must not be used by two threads at once, nor after a
+# fork, so every thread of every process opens its own on first use. The
+# threaded dev servers start a thread per request, so connections whose
+# thread has finished are closed the next time a thread opens one.
+
+import os
+import sqlite3
+import threading
+import weakref
+
+
+def connect_wal(path, timeout=10, **kwargs):
+    """
+    sqlite3.connect() in WAL mode, so readers do not block the writer. The
+    connection may be closed from another thread than the one that used it.
+    """
+    db = sqlite3.connect(path, timeout=timeout, check_same_thread=False, **kwargs)
+    db.execute('PRAGMA journal_mode=WAL')
+    return db
+
+
+class ThreadConnections:
+    """
+    One connection per thread and process, opened by connect() on first use.
+    """
+
+    def __init__(self, connect):
+        self._connect = connect
+        self._inherited = []
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            ref = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: ref() is not None and ref()._after_fork())
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._open = []  # (thread, connection)
+
+    def _after_fork(self):
+        # The parent's connections must not be used by the child, nor closed:
+        # closing them would release locks the parent still holds
+        self._inherited += [db for thread, db in self._open]
+        self._reset()
+
+    def get(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = self._connect()
+            with self._lock:
+                finished = [entry for entry in self._open if not entry[0].is_alive()]
+                self._open = [entry for entry in self._open if entry[0].is_alive()]
+                self._open.append((threading.current_thread(), db))
+            for thread, old_db in finished:
+                old_db.close()
+        return db
@@ -0,0 +1,153 @@
+# Local stand-in for api.open-meteo.com and geocoding-api.open-meteo.com
+# Run it with: python stub_open_meteo.py --port 8085
+# and point the scripts at it, e.g.
+#   python scrape_weather_data.py --locations sites.csv --base-url http://127.0.0.1:8085
+
+import argparse
+import datetime
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# A few cities for the geocoding endpoint
+CITIES = {
+    'berlin': (52.52, 13.41),
+    'london': (51.51, -0.13),
+    'paris': (48.85, 2.35),
+    'madrid': (40.42, -3.70),
+    'rome': (41.89, 12.48),
+    'vienna': (48.21, 16.37),
+}
+
+
+def synthetic_forecast(latitude, longitude, hours=168):
+    """
+    Build a forecast payload shaped like the Open-Meteo /v1/forecast response.
+    """
+    start = datetime.datetime(2024, 1, 1)
+    times, temperature, humidity, wind_speed = [], [], [], []
+    for hour in range(hours):
+        daily = math.sin(2 * math.pi * (hour % 24) / 24)
+        times.append((start + datetime.timedelta(hours=hour)).strftime('%Y-%m-%dT%H:%M'))
+        temperature.append(round(10 + latitude / 10 + 6 * daily, 1))
+        humidity.append(int(60 - 20 * daily))
+        wind_speed.append(round(abs(10 + 5 * math.cos(hour / 7 + longitude)), 1))
+    return {
+        'latitude': latitude,
+        'longitude': longitude,
+        'current_weather': {
+            'temperature': temperature[0],
+            'windspeed': wind_speed[0],
+            'weathercode': 3,
+        },
+        'hourly_units': {
+            'time': 'iso8601',
+            'temperature_2m': '°C',
+            'relative_humidity_2m': '%',
+            'wind_speed_10m': 'km/h',
+        },
+        'hourly': {
+            'time': times,
+            'temperature_2m': temperature,
+            'relative_humidity_2m': humidity,
+            'wind_speed_10m': wind_speed,
+        },
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers /v1/forecast and /v1/search with synthetic data.
+    """
+    # Keep connections alive so pooled clients can reuse them
+    protocol_version = 'HTTP/1.1'
+
+    # Set by make_server()
+    latency = 0.0
+    failure_rate = 0.0
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        # Simulate an overloaded upstream so retries get exercised
+        if self.failure_rate and random.random() < self.failure_rate:
+            self.send_error(503)
+            return
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/v1/forecast':
+            latitude = float(query.get('latitude', ['0'])[0])
+            longitude = float(query.get('longitude', ['0'])[0])
+            hours = 24 * int(query.get('forecast_days', ['7'])[0])
+            payload = synthetic_forecast(latitude, longitude, hours)
+        elif url.path == '/v1/search':
+            name = query.get('name', [''])[0].strip().lower()
+            if name in CITIES:
+                latitude, longitude = CITIES[name]
+                payload = {'results': [{'name': name.title(), 'latitude': latitude, 'longitude': longitude}]}
+            else:
+                payload = {}
+        else:
+            self.send_error(404)
+            return
+
+        body = json.dumps(payload).encode('utf-8')
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep benchmark output readable
+        pass
+
+
+def make_server(host='127.0.0.1', port=0, latency=0.0, failure_rate=0.0):
+    """
+    Create the stub server. Port 0 picks a free port (see server.server_address).
+    """
+    handler = type('ConfiguredStubHandler', (StubHandler,), {
+        'latency': latency,
+        'failure_rate': failure_rate,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_background(**kwargs):
+    """
+    Start the stub server on a daemon thread and return (server, base_url).
+    """
+    server = make_server(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return server, f'http://{host}:{port}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local Open-Meteo stub server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8085)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to sleep per request')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.failure_rate)
+    print(f'Stub Open-Meteo listening on http://{args.host}:{args.port}')
+    server.serve_forever()
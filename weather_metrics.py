@@ -0,0 +1,141 @@
+# Vectorised derived metrics for hourly weather series
+#
+# Every function works on NumPy arrays whose last axis is time, so the same
+# call handles one location (shape (hours,)) or thousands of locations
+# stacked into a 2-D array (shape (locations, hours)) in a single pass.
+# Missing readings are NaN and are ignored by the aggregates.
+#
+# Units follow the Open-Meteo defaults: °C, % and km/h.
+
+import warnings
+
+import numpy as np
+
+HOURS_PER_DAY = 24
+
+
+def stack_series(series_list, dtype=np.float32):
+    """
+    Stack per-location series of possibly different lengths into a 2-D
+    (locations, hours) array, padding the short ones with NaN.
+    """
+    length = max((len(series) for series in series_list), default=0)
+    stacked = np.full((len(series_list), length), np.nan, dtype=dtype)
+    for row, series in enumerate(series_list):
+        stacked[row, :len(series)] = series
+    return stacked
+
+
+def daily_stats(values, hours_per_day=HOURS_PER_DAY):
+    """
+    Daily min/max/mean over whole days. Trailing hours that do not fill a
+    day are dropped. Returns a dict of arrays shaped (..., days).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    days = values.shape[-1] // hours_per_day
+    by_day = values[..., :days * hours_per_day].reshape(values.shape[:-1] + (days, hours_per_day))
+    # All-NaN days yield NaN; silence the "empty slice" warnings for them
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return {
+            'min': np.nanmin(by_day, axis=-1),
+            'max': np.nanmax(by_day, axis=-1),
+            'mean': np.nanmean(by_day, axis=-1),
+        }
+
+
+def rolling_mean(values, window):
+    """
+    Trailing rolling mean over `window` hours, computed with cumulative sums.
+    The first window - 1 positions are NaN, as are windows with no readings.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    pad = [(0, 0)] * (values.ndim - 1) + [(1, 0)]
+    sums = np.pad(np.cumsum(np.where(valid, values, 0.0), axis=-1), pad)
+    counts = np.pad(np.cumsum(valid, axis=-1), pad)
+    window_sums = sums[..., window:] - sums[..., :-window]
+    window_counts = counts[..., window:] - counts[..., :-window]
+
+    result = np.full(values.shape, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result[..., window - 1:] = np.where(window_counts > 0, window_sums / window_counts, np.nan)
+    return result
+
+
+def dew_point(temperature, humidity):
+    """
+    Dew point (°C) from temperature (°C) and relative humidity (%) using the
+    Magnus formula.
+    """
+    a, b = 17.62, 243.12
+    temperature = np.asarray(temperature, dtype=np.float64)
+    humidity = np.clip(np.asarray(humidity, dtype=np.float64), 1e-3, 100.0)
+    gamma = np.log(humidity / 100.0) + a * temperature / (b + temperature)
+    return b * gamma / (a - gamma)
+
+
+def heat_index(temperature, humidity):
+    """
+    Heat index (°C) using the NWS formulation: Steadman's simple estimate,
+    replaced by the Rothfusz regression where the estimate reaches 80 °F.
+    Below 80 °F (26.7 °C), where the NWS tables start, the air temperature
+    is returned unchanged.
+    """
+    t = np.asarray(temperature, dtype=np.float64) * 9 / 5 + 32
+    rh = np.asarray(humidity, dtype=np.float64)
+    simple = 0.5 * (t + 61.0 + (t - 68.0) * 1.2 + rh * 0.094)
+    rothfusz = (
+        -42.379 + 2.04901523 * t + 10.14333127 * rh
+        - 0.22475541 * t * rh - 6.83783e-3 * t * t - 5.481717e-2 * rh * rh
+        + 1.22874e-3 * t * t * rh + 8.5282e-4 * t * rh * rh - 1.99e-6 * t * t * rh * rh
+    )
+    fahrenheit = np.where((simple + t) / 2 >= 80.0, rothfusz, simple)
+    return np.where(t >= 80.0, (fahrenheit - 32) * 5 / 9, temperature)
+
+
+def wind_chill(temperature, wind_speed):
+    """
+    Wind chill (°C) from temperature (°C) and wind speed (km/h) using the
+    North American formula. Outside its valid range (above 10 °C or below
+    4.8 km/h) the air temperature is returned unchanged.
+    """
+    temperature = np.asarray(temperature, dtype=np.float64)
+    wind_speed = np.asarray(wind_speed, dtype=np.float64)
+    v = np.power(np.maximum(wind_speed, 0.0), 0.16)
+    chill = 13.12 + 0.6215 * temperature - 11.37 * v + 0.3965 * temperature * v
+    return np.where((temperature <= 10.0) & (wind_speed > 4.8), chill, temperature)
+
+
+def compute_metrics(temperature, humidity, wind_speed, window=HOURS_PER_DAY):
+    """
+    All derived metrics for one location or a stack of locations.
+    """
+    return {
+        'daily_temperature': daily_stats(temperature),
+        'temperature_rolling_mean': rolling_mean(temperature, window),
+        'dew_point': dew_point(temperature, humidity),
+        'heat_index': heat_index(temperature, humidity),
+        'wind_chill': wind_chill(temperature, wind_speed),
+    }
+
+
+def metric_summary(metrics, day=0):
+    """
+    Headline numbers for one location, as plain floats for templates and
+    reports: the given day's min/max/mean temperature, the first-hour dew
+    point, and the extremes of heat index and wind chill.
+    """
+    daily = metrics['daily_temperature']
+    summary = {
+        'dew_point': metrics['dew_point'][0],
+        'heat_index_max': np.nanmax(metrics['heat_index']),
+        'wind_chill_min': np.nanmin(metrics['wind_chill']),
+    }
+    if daily['mean'].shape[-1] > day:
+        summary.update({
+            'temperature_min': daily['min'][day],
+            'temperature_max': daily['max'][day],
+            'temperature_mean': daily['mean'][day],
+        })
+    return {name: round(float(value), 1) for name, value in summary.items()}
@@ -0,0 +1,80 @@
+# Columnar storage for Open-Meteo forecasts
+#
+# A dataset is a directory holding one typed .npy array per hourly series
+# plus a small meta.json with everything else from the API response:
+#
+#   weather_data/
+#       meta.json
+#       time.npy                   datetime64[m]
+#       temperature_2m.npy         float32
+#       relative_humidity_2m.npy   float32
+#       wind_speed_10m.npy         float32
+#
+# .npy files (rather than a single .npz) can be memory-mapped, so the report
+# generator only pages in the series it actually plots.
+
+import json
+import os
+
+import numpy as np
+
+META_FILE = 'meta.json'
+
+
+def hourly_to_arrays(hourly):
+    """
+    Convert the 'hourly' block of an API response into typed NumPy arrays.
+    Missing readings (null in the JSON) become NaN.
+    """
+    arrays = {}
+    for name, values in hourly.items():
+        if name == 'time':
+            arrays[name] = np.array(values, dtype='datetime64[m]')
+        else:
+            arrays[name] = np.array([np.nan if v is None else v for v in values], dtype=np.float32)
+    return arrays
+
+
+def save_columnar(data, directory):
+    """
+    Write an API response as a columnar dataset directory.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name, array in hourly_to_arrays(data['hourly']).items():
+        np.save(os.path.join(directory, f'{name}.npy'), array)
+    meta = {key: value for key, value in data.items() if key != 'hourly'}
+    meta['hourly_series'] = list(data['hourly'])
+    with open(os.path.join(directory, META_FILE), 'w') as f:
+        json.dump(meta, f)
+
+
+def load_columnar(directory, mmap=True):
+    """
+    Load a columnar dataset. With mmap=True the series are read-only
+    memory-mapped arrays instead of in-memory copies.
+    """
+    with open(os.path.join(directory, META_FILE)) as f:
+        data = json.load(f)
+    mmap_mode = 'r' if mmap else None
+    data['hourly'] = {
+        name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+        for name in data.pop('hourly_series')
+    }
+    return data
+
+
+def is_columnar(path):
+    """
+    True if path is a columnar dataset directory.
+    """
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+def load_weather_data(path, mmap=True):
+    """
+    Load either a JSON response file or a columnar dataset directory.
+    """
+    if is_columnar(path):
+        return load_columnar(path, mmap=mmap)
+    with open(path, 'r') as f:
+        return json.load(f)